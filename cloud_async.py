@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# 异步云开发客户端
+#
+# 桌面程序的云指令循环运行在asyncio事件循环中，这里用aiohttp发送请求，查询和标记指令时不阻塞事件循环：
+#   - 一个ClientSession复用keep-alive连接池，连接数上限为 pool_size
+#   - 连接失败(请求尚未发出)时按 cloud_http 相同的退避规则重试，其他错误交给调用方
+#   - 访问令牌由共享的 TokenService 提供，令牌失效时同样作废
+import json
+import asyncio
+import aiohttp
+from cloud_http import HTTP_CONFIG
+from cloud_commands import check_result, query_records
+
+
+class AsyncCloudClient:
+    """基于aiohttp的微信云开发数据库客户端，需在事件循环中使用"""
+    def __init__(self, api_url, env_id, tokens, timeout=10, pool_size=HTTP_CONFIG['pool_maxsize']):
+        self.api_url = api_url
+        self.env_id = env_id
+        self.tokens = tokens
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=HTTP_CONFIG['connect_timeout'])
+        self.pool_size = pool_size
+        self.session = None
+
+    def _session(self):
+        """首次使用时在当前事件循环中创建Session"""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=self.timeout
+            )
+        return self.session
+
+    async def post(self, query):
+        """发送一条查询语句，返回 (响应字典, 使用的令牌)"""
+        # 令牌通常由后台线程提前刷新，只有过期时才会同步请求，放到线程池中避免阻塞事件循环
+        access_token = await asyncio.to_thread(self.tokens.get_token)
+        for attempt in range(HTTP_CONFIG['retries'] + 1):
+            try:
+                async with self._session().post(
+                    self.api_url,
+                    params={'access_token': access_token},
+                    json={'env': self.env_id, 'query': query}
+                ) as res:
+                    res.raise_for_status()
+                    return await res.json(content_type=None), access_token
+            except aiohttp.ClientConnectorError:
+                if attempt == HTTP_CONFIG['retries']:
+                    raise
+                await asyncio.sleep(HTTP_CONFIG['backoff_factor'] * 2 ** attempt)
+
+    async def query(self, query):
+        """执行 databasequery 查询，返回记录(dict)列表，失败时抛出异常"""
+        result, access_token = await self.post(query)
+        return query_records(result, self.tokens, access_token)
+
+    async def update_status(self, collection, doc_id, status='completed', fields=None):
+        """更新指令状态，fields为同时写入的其他字段(如执行结果)，失败时抛出异常"""
+        data = json.dumps(dict(fields or {}, status=status), ensure_ascii=False)
+        result, access_token = await self.post(
+            f"db.collection('{collection}').doc('{doc_id}').update({{data: {data}}})")
+        return check_result(result, self.tokens, access_token)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# 云指令增量轮询
+#
+# 以 (timestamp, _id) 作为高水位游标，每次只查询游标之后且 status != 'completed' 的指令，
+# 按时间顺序分页取回，两次轮询之间连续发出的多条指令不会丢失。
+# 启动后第一次轮询只用集合中最新的一条指令确定游标，不执行任何指令，重启后不会重放积压的旧指令。
+# 轮询间隔自适应：有新指令后回到最短间隔，空闲时逐次放大到上限，出错时同样放慢。
+# 游标已经越过、但这次没能执行或标记的指令(如执行队列已满)用 requeue() 放回，下一轮和新指令一起返回。
+# 注意: timestamp 由下发指令的一端(小程序)写入，游标依赖各端时钟基本一致；
+#       时钟明显偏慢的设备写入的指令早于游标，会被一直跳过。
+# 桌面程序(test.py)和坐姿监测共用；查询函数可以是普通函数(fetch)或协程(fetch_async)。
+import json
+import cloud_http
+from cloud_token import TOKEN_ERRORS
+
+
+def database_query(api_url, env_id, tokens, query, timeout=10):
+    """执行 databasequery 查询，返回记录(dict)列表，失败时抛出异常"""
+    access_token = tokens.get_token()
+    res = cloud_http.post(
+        f"{api_url}?access_token={access_token}",
+        json={"env": env_id, "query": query},
+        timeout=timeout
+    )
+    res.raise_for_status()
+    return query_records(res.json(), tokens, access_token)
+
+
+def check_result(result, tokens, access_token):
+    """检查云开发接口返回的错误码，令牌失效时作废令牌；出错时抛出异常"""
+    if result.get('errcode') in TOKEN_ERRORS:
+        tokens.invalidate(access_token)
+    if result.get('errcode', 0) != 0:
+        raise Exception(f"云开发错误: {result.get('errmsg')} (Code: {result.get('errcode')})")
+    return result
+
+
+def query_records(result, tokens, access_token):
+    """把 databasequery 的返回结果解析为记录(dict)列表"""
+    check_result(result, tokens, access_token)
+    records = []
+    for item in result.get('data', []):
+        # 接口返回的每条记录是JSON字符串
+        record = json.loads(item) if isinstance(item, str) else item
+        if isinstance(record, dict):
+            records.append(record)
+    return records
+
+
+def _literal(value):
+    """游标值转换为查询语句中的字面量"""
+    if isinstance(value, dict) and '$date' in value:
+        return f"new Date({json.dumps(value['$date'])})"
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _sort_key(command):
+    timestamp = command.get('timestamp')
+    if isinstance(timestamp, dict):
+        timestamp = timestamp.get('$date')
+    return (timestamp if timestamp is not None else 0, command.get('_id', ''))
+
+
+class CommandPoller:
+    """按高水位游标增量获取未完成的云指令，并给出下一次轮询的间隔"""
+    def __init__(self, run_query, collection='commands', page_size=10, max_pages=5,
+                 min_interval=1.0, max_interval=10.0, idle_backoff=1.5):
+        self.run_query = run_query            # 查询函数: 查询语句 -> 记录列表
+        self.collection = collection
+        self.page_size = page_size
+        self.max_pages = max_pages            # 单次轮询最多取回的页数，剩余的下一轮继续
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_backoff = idle_backoff      # 空闲时每次轮询间隔乘以该系数
+        self.cursor = None                    # 已处理的最新 (timestamp, _id)
+        self.seeded = False                   # 是否已用现有的最新指令确定初始游标
+        self.retry = []                       # 放回的指令，下一轮重新返回
+        self.interval = min_interval
+
+    def build_query(self, skip):
+        where = "status: db.command.neq('completed')"
+        if self.cursor is not None:
+            where += f", timestamp: db.command.gte({_literal(self.cursor[0])})"
+        return (f"db.collection('{self.collection}')"
+                f".where({{{where}}})"
+                ".orderBy('timestamp', 'asc')"
+                ".orderBy('_id', 'asc')"
+                f".skip({skip})"
+                f".limit({self.page_size})"
+                ".get()")
+
+    def build_seed_query(self):
+        """查询集合中最新的一条指令(不论状态)，作为初始游标"""
+        return (f"db.collection('{self.collection}')"
+                ".orderBy('timestamp', 'desc')"
+                ".orderBy('_id', 'desc')"
+                ".limit(1)"
+                ".get()")
+
+    def requeue(self, command, limit=None):
+        """放回一条没能执行或标记的指令，下一次 fetch 时重新返回；已放回 limit 次时放弃并返回False"""
+        requeued = command.get('_requeued', 0)
+        if limit is not None and requeued >= limit:
+            return False
+        self.retry.append(dict(command, _requeued=requeued + 1))
+        return True
+
+    def is_new(self, command):
+        if self.cursor is None:
+            return True
+        return _sort_key(command) > _sort_key({'timestamp': self.cursor[0], '_id': self.cursor[1]})
+
+    def fetch(self):
+        """返回游标之后的新指令(按时间顺序)并推进游标；查询失败时抛出异常，游标不变"""
+        if not self.seeded:
+            return self._seed(self.run_query(self.build_seed_query()))
+        commands = []
+        for page in range(self.max_pages):
+            if not self._collect(commands, self.run_query(self.build_query(page * self.page_size))):
+                break
+        return self._advance(commands)
+
+    async def fetch_async(self):
+        """fetch 的协程版本，run_query 为协程函数"""
+        if not self.seeded:
+            return self._seed(await self.run_query(self.build_seed_query()))
+        commands = []
+        for page in range(self.max_pages):
+            if not self._collect(commands, await self.run_query(self.build_query(page * self.page_size))):
+                break
+        return self._advance(commands)
+
+    def _seed(self, records):
+        """以现有的最新指令作为游标，启动前已存在的指令都不执行"""
+        if records:
+            self.cursor = (records[0].get('timestamp'), records[0].get('_id', ''))
+        self.seeded = True
+        return []
+
+    def _collect(self, commands, records):
+        """收集一页中的新指令，返回是否还有下一页"""
+        commands.extend(record for record in records if self.is_new(record))
+        return len(records) >= self.page_size
+
+    def _advance(self, commands):
+        commands.sort(key=_sort_key)
+        if commands:
+            last = commands[-1]
+            self.cursor = (last.get('timestamp'), last.get('_id', ''))
+        retry, self.retry = self.retry, []
+        return retry + commands
+
+    def next_interval(self, active):
+        """有新指令时回到最短间隔，否则逐次放大(不超过上限)"""
+        if active:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.idle_backoff)
+        return self.interval
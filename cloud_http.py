@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# 共享HTTP客户端
+#
+# 桌面程序(test.py)、坐姿监测和语音对话的HTTP请求共用同一个 requests.Session：
+#   - 按主机复用keep-alive连接池，每秒一次的指令轮询不再每次重新建立TCP+TLS连接
+#   - 未指定超时的请求使用统一的 (连接, 读取) 超时，不会无限期阻塞
+#   - 连接失败(请求尚未发出)对所有方法自动重试；429/5xx 只对GET重试，
+#     POST可能是写操作(databaseadd/update)，由调用方决定是否重试，避免重复写入
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HTTP_CONFIG = {
+    'pool_connections': 4,              # 缓存连接池的主机数
+    'pool_maxsize': 8,                  # 每个主机保持的最大连接数
+    'connect_timeout': 5,               # 默认连接超时(秒)
+    'read_timeout': 20,                 # 默认读取超时(秒)
+    'retries': 3,                       # 最多重试次数
+    'backoff_factor': 0.5,              # 重试间隔 0.5s, 1s, 2s...
+    'retry_statuses': (429, 500, 502, 503, 504)
+}
+
+# 网络不可用导致的错误(与请求内容无关)，离线缓存补传时不计入失败次数
+NETWORK_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+_session = None
+_lock = threading.Lock()
+
+
+def get_session():
+    """返回进程内共享的Session(首次调用时创建)"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                retry = Retry(
+                    total=HTTP_CONFIG['retries'],
+                    connect=HTTP_CONFIG['retries'],
+                    read=0,
+                    status=HTTP_CONFIG['retries'],
+                    allowed_methods=frozenset({'GET', 'HEAD'}),
+                    status_forcelist=HTTP_CONFIG['retry_statuses'],
+                    backoff_factor=HTTP_CONFIG['backoff_factor'],
+                    raise_on_status=False
+                )
+                adapter = HTTPAdapter(pool_connections=HTTP_CONFIG['pool_connections'],
+                                      pool_maxsize=HTTP_CONFIG['pool_maxsize'], max_retries=retry)
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def request(method, url, timeout=None, **kwargs):
+    """发送请求，timeout默认为 (连接超时, 读取超时)"""
+    if timeout is None:
+        timeout = (HTTP_CONFIG['connect_timeout'], HTTP_CONFIG['read_timeout'])
+    return get_session().request(method, url, timeout=timeout, **kwargs)
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def close():
+    """关闭所有保持的连接(程序退出时调用)"""
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
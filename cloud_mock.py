@@ -0,0 +1,552 @@
+# -*- coding: utf-8 -*-
+# 微信云开发 / 腾讯云COS 本地模拟服务器
+#
+# 实现两个程序用到的接口子集，用于在没有真实账号和网络的情况下测试轮询、上传和重试：
+#   GET  /cgi-bin/token         - 签发access_token，过期或未签发的令牌返回 40001/42001
+#   POST /tcb/databasequery     - commands 等集合的 where/orderBy/skip/limit/get 查询，以及 doc().update()
+#   POST /tcb/databaseadd       - collection().add({data: ...})，支持单条和批量
+#   PUT  /<对象键>               - COS上传，校验 Content-MD5；指定 --cos-dir 时保存到该目录，GET 同一路径下载
+#                                  (对象键不能指向目录之外，否则返回 400)
+# 每类接口(token/query/add/cos)可分别配置延迟、抖动、错误率和限流，COS还可以限制带宽。
+# 测试辅助接口：
+#   POST /mock/commands         - 插入一条待执行指令，如 {"command": "capture"}
+#   GET  /mock/stats            - 各接口的请求数、错误数、限流数和平均延迟
+#   POST /mock/reset            - 清空数据和统计
+#
+#   python cloud_mock.py --port 8765 --latency 80 --jitter 40 --error-rate 0.05 --rate-limit 20
+#   python cloud_mock.py --config mock.json --command-rate 0.5 --command capture
+# 程序配置中的 'mock_server' 设为 http://127.0.0.1:8765 即指向本服务器(见 apply_mock_endpoints)。
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import base64
+import random
+import hashlib
+import logging
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ENDPOINTS = ('token', 'query', 'add', 'cos')
+DATABASE_ROUTES = {'/tcb/databasequery': 'query', '/tcb/databaseadd': 'add'}
+
+# 每类接口的默认行为，可用 --config 指定的JSON文件按接口覆盖
+MOCK_CONFIG = {
+    'latency': 0.0,                     # 平均延迟(毫秒)
+    'jitter': 0.0,                      # 延迟的随机波动范围(±毫秒)
+    'error_rate': 0.0,                  # 随机返回 HTTP 500 的概率
+    'rate_limit': 0.0,                  # 每秒允许的请求数(0为不限)，超出时微信接口返回45011，COS返回503
+    'burst': 0,                         # 限流令牌桶容量(0为与每秒请求数相同)
+    'bandwidth': 0,                     # 上传带宽(字节/秒，0为不限)，只对COS有效
+    'token_expires_in': 7200            # 签发令牌的有效期(秒)，只对token有效
+}
+
+
+def apply_mock_endpoints(base_url, wx_cloud, cos=None):
+    """把程序配置中的微信接口和COS地址改为指向模拟服务器"""
+    base_url = base_url.rstrip('/')
+    wx_cloud['token_url'] = f"{base_url}/cgi-bin/token"
+    for key, path in (('api_url', 'databasequery'), ('query_api_url', 'databasequery'),
+                      ('add_api_url', 'databaseadd')):
+        if key in wx_cloud:
+            wx_cloud[key] = f"{base_url}/tcb/{path}"
+    if cos is not None:
+        parts = urlsplit(base_url)
+        cos['Scheme'] = parts.scheme
+        cos['Domain'] = parts.netloc
+
+
+# ================== 查询语句解析 ==================
+_DOUBLE_QUOTED = r'"(?:[^"\\]|\\.)*"'
+_SINGLE_QUOTED = r"'(?:[^'\\]|\\.)*'"
+# 依次匹配: new Date(值)、双引号字符串、单引号字符串、不带引号的键
+_TOKEN = re.compile(
+    rf"new Date\(\s*({_DOUBLE_QUOTED}|{_SINGLE_QUOTED}|[\d.]+)\s*\)"
+    rf"|({_DOUBLE_QUOTED})|'((?:[^'\\]|\\.)*)'|([A-Za-z_$][\w$]*)(?=\s*:)"
+)
+_CALL = re.compile(r'\.?\s*([A-Za-z_]\w*)\s*\(')
+
+
+def parse_js_value(text):
+    """把查询语句中的JS字面量(单引号字符串、不带引号的键、new Date)转换为Python值"""
+    def convert(match):
+        date, double, single, key = match.groups()
+        if date is not None:
+            return _TOKEN.sub(convert, date)
+        if double is not None:
+            return double
+        if single is not None:
+            return json.dumps(single.replace("\\'", "'"))
+        return json.dumps(key)
+    text = _TOKEN.sub(convert, text.strip())
+    return json.loads(text)
+
+
+def split_calls(query):
+    """db.collection('a').where({...}).get() -> [('collection', "'a'"), ('where', '{...}'), ('get', '')]"""
+    calls = []
+    i = 0
+    while i < len(query):
+        match = _CALL.match(query, i)
+        if not match:
+            i += 1
+            continue
+        depth, quote, j = 1, None, match.end()
+        while j < len(query) and depth:
+            ch = query[j]
+            if quote:
+                if ch == '\\':
+                    j += 1
+                elif ch == quote:
+                    quote = None
+            elif ch in '\'"':
+                quote = ch
+            elif ch == '(':
+                depth += 1
+            elif ch == ')':
+                depth -= 1
+            j += 1
+        calls.append((match.group(1), query[match.end():j - 1]))
+        i = j
+    return calls
+
+
+def split_top_level(text, separator=','):
+    """按不在括号和字符串内的分隔符切分"""
+    parts, depth, quote, start = [], 0, None, 0
+    for i, ch in enumerate(text):
+        if quote:
+            if ch == quote and text[i - 1] != '\\':
+                quote = None
+        elif ch in '\'"':
+            quote = ch
+        elif ch in '([{':
+            depth += 1
+        elif ch in ')]}':
+            depth -= 1
+        elif ch == separator and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    if text[start:].strip():
+        parts.append(text[start:])
+    return parts
+
+
+_COMMAND = re.compile(r'^db\.command\.(\w+)\((.*)\)$', re.S)
+_OPERATORS = {
+    'eq': lambda a, b: a == b,
+    'neq': lambda a, b: a != b,
+    'gt': lambda a, b: a is not None and a > b,
+    'gte': lambda a, b: a is not None and a >= b,
+    'lt': lambda a, b: a is not None and a < b,
+    'lte': lambda a, b: a is not None and a <= b,
+    'in': lambda a, b: a in b,
+}
+
+
+def parse_where(text):
+    """where({status: db.command.neq('completed'), kind: 'photo'}) -> [(字段, 比较函数, 值)]"""
+    conditions = []
+    for item in split_top_level(text.strip()[1:-1]):
+        key, _, expr = item.partition(':')
+        key, expr = key.strip().strip('\'"'), expr.strip()
+        match = _COMMAND.match(expr)
+        if match:
+            op, value = match.group(1), parse_js_value(match.group(2))
+        else:
+            op, value = 'eq', parse_js_value(expr)
+        if op not in _OPERATORS:
+            raise ValueError(f"不支持的查询操作符: {op}")
+        conditions.append((key, _OPERATORS[op], value))
+    return conditions
+
+
+def _sortable(value):
+    if isinstance(value, dict):
+        value = value.get('$date')
+    return (value is None, value if value is not None else 0)
+
+
+# ================== 模拟数据与接口行为 ==================
+class MockCloud:
+    """模拟服务器的状态：令牌、集合、COS对象、限流器和统计"""
+    def __init__(self, config=None, cos_dir=None):
+        self.config = {name: dict(MOCK_CONFIG) for name in ENDPOINTS}
+        for name, overrides in (config or {}).items():
+            self.config[name].update(overrides)
+        self.cos_dir = cos_dir                # 保存上传对象的目录，为空时只记录大小和摘要
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.tokens = {}                  # 令牌 -> 过期时间
+            self.collections = {}             # 集合名 -> {_id: 记录}
+            self.objects = {}                 # 对象键 -> {'size', 'etag'}
+            self.buckets = {name: [0.0, 0.0] for name in ENDPOINTS}  # [可用令牌数, 上次补充时间]
+            self.stats = {name: {'requests': 0, 'errors': 0, 'throttled': 0, 'latency_ms': 0.0}
+                          for name in ENDPOINTS}
+
+    # ---- 通用行为 ----
+    def admit(self, endpoint):
+        """统计请求并判定本次是 'ok'、'throttled' 还是 'error'"""
+        cfg = self.config[endpoint]
+        with self.lock:
+            self.stats[endpoint]['requests'] += 1
+            if cfg['rate_limit'] > 0:
+                capacity = cfg['burst'] or cfg['rate_limit']
+                bucket = self.buckets[endpoint]
+                now = time.monotonic()
+                if bucket[1] == 0:
+                    bucket[0] = capacity          # 首个请求时令牌桶是满的
+                else:
+                    bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * cfg['rate_limit'])
+                bucket[1] = now
+                if bucket[0] < 1:
+                    self.stats[endpoint]['throttled'] += 1
+                    return 'throttled'
+                bucket[0] -= 1
+            if random.random() < cfg['error_rate']:
+                self.stats[endpoint]['errors'] += 1
+                return 'error'
+        return 'ok'
+
+    def delay(self, endpoint, size=0):
+        """按配置的延迟、抖动和带宽等待，返回等待的秒数"""
+        cfg = self.config[endpoint]
+        seconds = max(0.0, cfg['latency'] + random.uniform(-cfg['jitter'], cfg['jitter'])) / 1000
+        if cfg['bandwidth'] > 0:
+            seconds += size / cfg['bandwidth']
+        if seconds:
+            time.sleep(seconds)
+        return seconds
+
+    def record_latency(self, endpoint, elapsed):
+        with self.lock:
+            stat = self.stats[endpoint]
+            stat['latency_ms'] += (elapsed * 1000 - stat['latency_ms']) / stat['requests']
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'endpoints': {name: dict(stat, latency_ms=round(stat['latency_ms'], 1))
+                              for name, stat in self.stats.items()},
+                'collections': {name: len(records) for name, records in self.collections.items()},
+                'cos_objects': len(self.objects),
+                'cos_bytes': sum(obj['size'] for obj in self.objects.values())
+            }
+
+    # ---- 微信接口 ----
+    def issue_token(self):
+        token = uuid.uuid4().hex
+        expires_in = int(self.config['token']['token_expires_in'])
+        with self.lock:
+            self.tokens[token] = time.time() + expires_in
+        return {'access_token': token, 'expires_in': expires_in}
+
+    def check_token(self, token):
+        """返回0或令牌错误码"""
+        with self.lock:
+            expires_at = self.tokens.get(token)
+        if expires_at is None:
+            return 40001
+        if time.time() >= expires_at:
+            return 42001
+        return 0
+
+    def add_command(self, command, **fields):
+        record = {'_id': uuid.uuid4().hex[:24], 'command': command, 'status': 'pending',
+                  'timestamp': int(time.time() * 1000)}
+        record.update(fields)
+        with self.lock:
+            self.collections.setdefault('commands', {})[record['_id']] = record
+        return record
+
+    def run_query(self, query):
+        """执行一条查询语句，返回微信接口格式的响应字典"""
+        calls = split_calls(query)
+        if len(calls) < 2 or calls[0][0] != 'collection':
+            raise ValueError(f"无法解析的查询语句: {query}")
+        name = parse_js_value(calls[0][1])
+        method = calls[1][0]
+        with self.lock:
+            records = self.collections.setdefault(name, {})
+            if method == 'add':
+                return self._add(records, calls[1][1])
+            if method == 'doc':
+                return self._doc(records, parse_js_value(calls[1][1]), calls[2:])
+            return self._select(records, calls[1:])
+
+    def _add(self, records, argument):
+        data = parse_js_value(argument)['data']
+        id_list = []
+        for item in data if isinstance(data, list) else [data]:
+            record = dict(item, _id=uuid.uuid4().hex[:24])
+            records[record['_id']] = record
+            id_list.append(record['_id'])
+        return {'errcode': 0, 'errmsg': 'ok', 'id_list': id_list}
+
+    def _doc(self, records, doc_id, calls):
+        record = records.get(doc_id)
+        method, argument = calls[0] if calls else ('get', '')
+        if method == 'update':
+            if record is not None:
+                record.update(parse_js_value(argument)['data'])
+            return {'errcode': 0, 'errmsg': 'ok', 'matched': int(record is not None),
+                    'modified': int(record is not None), 'id': ''}
+        return {'errcode': 0, 'errmsg': 'ok', 'pager': {'Offset': 0, 'Limit': 1, 'Total': int(record is not None)},
+                'data': [json.dumps(record, ensure_ascii=False)] if record is not None else []}
+
+    def _select(self, records, calls):
+        rows = list(records.values())
+        skip, limit = 0, 20
+        orders = []
+        for method, argument in calls:
+            if method == 'where':
+                for key, compare, value in parse_where(argument):
+                    rows = [row for row in rows if compare(row.get(key), value)]
+            elif method == 'orderBy':
+                field, direction = (parse_js_value(part) for part in split_top_level(argument))
+                orders.append((field, direction == 'desc'))
+            elif method == 'skip':
+                skip = int(argument)
+            elif method == 'limit':
+                limit = int(argument)
+        # 多个排序条件从最后一个开始稳定排序
+        for field, reverse in reversed(orders):
+            rows.sort(key=lambda row: _sortable(row.get(field)), reverse=reverse)
+        total = len(rows)
+        rows = rows[skip:skip + limit]
+        return {'errcode': 0, 'errmsg': 'ok', 'pager': {'Offset': skip, 'Limit': limit, 'Total': total},
+                'data': [json.dumps(row, ensure_ascii=False) for row in rows]}
+
+    # ---- COS ----
+    def object_path(self, key):
+        """对象键对应的本地文件路径；未指定 cos_dir 时返回None，键指向目录之外时抛出 ValueError"""
+        if not self.cos_dir:
+            return None
+        root = os.path.realpath(self.cos_dir)
+        path = os.path.realpath(os.path.join(root, key))
+        if os.path.commonpath([root, path]) != root or path == root:
+            raise ValueError(f"invalid object key: {key}")
+        return path
+
+    def put_object(self, key, data):
+        """保存对象，返回ETag；键不合法时抛出 ValueError"""
+        etag = hashlib.md5(data).hexdigest()
+        path = self.object_path(key)
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+        with self.lock:
+            self.objects[key] = {'size': len(data), 'etag': etag}
+        return etag
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'             # 支持keep-alive，与真实服务一样复用连接
+    server_version = 'CloudMock/1.0'
+
+    @property
+    def cloud(self):
+        return self.server.cloud
+
+    def log_message(self, format, *args):
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def send(self, status, body, content_type='application/json; charset=utf-8', headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body, ensure_ascii=False)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def cos_error(self, status, code, message):
+        body = (f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{code}</Code>'
+                f'<Message>{message}</Message><RequestId>{uuid.uuid4().hex}</RequestId></Error>')
+        self.send(status, body, 'application/xml')
+
+    def handle_endpoint(self, endpoint, handler, size=0):
+        """统一处理限流、错误注入、延迟和统计"""
+        start = time.monotonic()
+        verdict = self.cloud.admit(endpoint)
+        self.cloud.delay(endpoint, size)
+        try:
+            if verdict == 'error':
+                if endpoint == 'cos':
+                    self.cos_error(500, 'InternalError', 'injected error')
+                else:
+                    self.send(500, {'errcode': -1, 'errmsg': 'system error'})
+            elif verdict == 'throttled':
+                if endpoint == 'cos':
+                    self.cos_error(503, 'SlowDown', 'rate limit exceeded')
+                else:
+                    self.send(200, {'errcode': 45011, 'errmsg': 'api minute-quota reach limit'})
+            else:
+                handler()
+        finally:
+            self.cloud.record_latency(endpoint, time.monotonic() - start)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        if url.path == '/cgi-bin/token':
+            def token():
+                if not params.get('appid'):
+                    self.send(200, {'errcode': 41002, 'errmsg': 'appid missing'})
+                else:
+                    self.send(200, self.cloud.issue_token())
+            self.handle_endpoint('token', token)
+        elif url.path == '/mock/stats':
+            self.send(200, self.cloud.snapshot())
+        else:
+            try:
+                path = self.cloud.object_path(unquote(url.path.lstrip('/')))
+            except ValueError as e:
+                self.cos_error(400, 'InvalidURI', str(e))
+                return
+            if path and os.path.isfile(path):
+                with open(path, 'rb') as f:
+                    self.send(200, f.read(), 'image/jpeg')
+            else:
+                self.cos_error(404, 'NoSuchKey', 'The specified key does not exist.')
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        body = self.read_body()
+        if url.path == '/mock/commands':
+            fields = json.loads(body or b'{}')
+            self.send(200, self.cloud.add_command(fields.pop('command', 'capture'), **fields))
+            return
+        if url.path == '/mock/reset':
+            self.cloud.reset()
+            self.send(200, {'errcode': 0, 'errmsg': 'ok'})
+            return
+        endpoint = DATABASE_ROUTES.get(url.path)
+        if endpoint is None:
+            self.send(404, {'errcode': 404, 'errmsg': 'not found'})
+            return
+
+        def database():
+            errcode = self.cloud.check_token(parse_qs(url.query).get('access_token', [''])[0])
+            if errcode:
+                self.send(200, {'errcode': errcode, 'errmsg': 'invalid credential'})
+                return
+            try:
+                request = json.loads(body)
+                self.send(200, self.cloud.run_query(request['query']))
+            except (ValueError, KeyError, TypeError) as e:
+                self.send(200, {'errcode': -501007, 'errmsg': f'invalid parameters: {e}'})
+        self.handle_endpoint(endpoint, database)
+
+    def do_PUT(self):
+        key = unquote(urlsplit(self.path).path.lstrip('/'))
+        data = self.read_body()
+
+        def put():
+            expected = self.headers.get('Content-MD5')
+            if expected and base64.b64decode(expected) != hashlib.md5(data).digest():
+                self.cos_error(400, 'BadDigest', 'The Content-MD5 you specified did not match what we received.')
+                return
+            try:
+                etag = self.cloud.put_object(key, data)
+            except ValueError as e:
+                self.cos_error(400, 'InvalidURI', str(e))
+                return
+            self.send(200, b'', headers={'ETag': f'"{etag}"'})
+        self.handle_endpoint('cos', put, len(data))
+
+
+class MockServer:
+    """在后台线程中运行的模拟服务器，供测试脚本内嵌使用"""
+    def __init__(self, host='127.0.0.1', port=0, config=None, cos_dir=None):
+        self.cloud = MockCloud(config, cos_dir)
+        self.httpd = ThreadingHTTPServer((host, port), MockRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.cloud = self.cloud
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="cloud-mock", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _command_generator(cloud, rate, command, stop):
+    """按泊松过程以平均 rate 条/秒插入指令"""
+    while not stop.wait(random.expovariate(rate)):
+        cloud.add_command(command)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="微信云开发/COS本地模拟服务器")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="所有接口的平均延迟(毫秒)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="延迟波动范围(±毫秒)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="随机返回500的概率")
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="每类接口每秒允许的请求数(0为不限)")
+    parser.add_argument('--bandwidth', type=float, default=0.0, help="COS上传带宽(KB/s，0为不限)")
+    parser.add_argument('--token-expires-in', type=int, default=7200, help="签发令牌的有效期(秒)")
+    parser.add_argument('--config', default=None, help="按接口覆盖配置的JSON文件，如 {\"cos\": {\"latency\": 300}}")
+    parser.add_argument('--cos-dir', default=None, help="保存上传图片的目录")
+    parser.add_argument('--command-rate', type=float, default=0.0, help="自动插入指令的平均速率(条/秒)")
+    parser.add_argument('--command', default='capture', help="自动插入的指令内容")
+    args = parser.parse_args(argv)
+
+    defaults = {'latency': args.latency, 'jitter': args.jitter, 'error_rate': args.error_rate,
+                'rate_limit': args.rate_limit}
+    config = {name: dict(defaults) for name in ENDPOINTS}
+    config['cos']['bandwidth'] = args.bandwidth * 1024
+    config['token']['token_expires_in'] = args.token_expires_in
+    if args.config:
+        with open(args.config, encoding='utf-8') as f:
+            for name, overrides in json.load(f).items():
+                if name not in config:
+                    parser.error(f"未知的接口类型: {name} (可选 {', '.join(ENDPOINTS)})")
+                config[name].update(overrides)
+
+    server = MockServer(args.host, args.port, config, args.cos_dir)
+    stop = threading.Event()
+    if args.command_rate > 0:
+        threading.Thread(target=_command_generator, args=(server.cloud, args.command_rate, args.command, stop),
+                         daemon=True).start()
+    print(f"模拟服务器已启动: {server.url}  (统计: {server.url}/mock/stats)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.httpd.server_close()
+        print(json.dumps(server.cloud.snapshot(), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
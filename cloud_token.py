@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+# 微信接口调用凭证(access_token)服务
+#
+# 桌面程序和坐姿监测进程共用一个令牌，缓存在带文件锁的共享文件中：
+#   - 缓存文件记录令牌和过期时间，任一进程刷新后其他进程直接读取，不重复调用 cgi-bin/token
+#   - 刷新时持有文件锁并重新读取缓存，多个线程/进程同时发现过期只会刷新一次
+#   - 后台线程在过期前 refresh_margin 秒主动刷新，轮询路径上不再出现刷新延迟
+#   - 接口返回令牌失效错误时调用 invalidate()，下一次 get_token() 重新获取
+import os
+import json
+import time
+import logging
+import threading
+import cloud_http
+
+try:
+    import fcntl
+except ImportError:                     # Windows 开发机上只做进程内互斥
+    fcntl = None
+
+TOKEN_URL = "https://api.weixin.qq.com/cgi-bin/token"
+TOKEN_ERRORS = {40001, 40014, 42001}    # 令牌无效/不合法/已过期
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'wx_access_token.json')
+
+
+class TokenService:
+    """带共享文件缓存和后台主动刷新的access_token服务"""
+    def __init__(self, appid, secret, cache_file=DEFAULT_CACHE_FILE, refresh_margin=300, retry_interval=30,
+                 token_url=TOKEN_URL):
+        self.appid = appid
+        self.secret = secret
+        self.cache_file = cache_file
+        self.token_url = token_url            # 可指向本地模拟服务器(见 cloud_mock.py)
+        self.refresh_margin = refresh_margin  # 距过期不足该秒数时主动刷新
+        self.retry_interval = retry_interval  # 刷新失败后的重试间隔(秒)
+        self.token = ''
+        self.expires_at = 0
+        self.lock = threading.Lock()          # 进程内合并并发刷新
+        self.cond = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.counters = {'refreshes': 0, 'cache_hits': 0, 'failures': 0}
+        os.makedirs(os.path.dirname(cache_file) or '.', exist_ok=True)
+
+    def get_token(self):
+        """返回有效的令牌，没有时同步刷新；无法获取时返回空字符串"""
+        if self.token and time.time() < self.expires_at:
+            return self.token
+        self.refresh()
+        return self.token
+
+    def invalidate(self, token):
+        """接口返回令牌失效时调用；只有仍是当前令牌时才作废，避免覆盖其他线程刚刷新的令牌"""
+        with self.lock:
+            if token and token == self.token:
+                self.token = ''
+                self.expires_at = 0
+                with self._file_lock():
+                    cached = self._read_cache()
+                    if cached.get('access_token') == token:
+                        self._write_cache('', 0)
+
+    def refresh(self, force=False):
+        """刷新令牌：先看共享缓存是否已被其他进程刷新，否则调用接口并写回缓存"""
+        with self.lock:
+            with self._file_lock():
+                cached = self._read_cache()
+                margin = self.refresh_margin if force else 0
+                if cached.get('access_token') and time.time() < cached.get('expires_at', 0) - margin:
+                    self.token, self.expires_at = cached['access_token'], cached['expires_at']
+                    self.counters['cache_hits'] += 1
+                    return True
+                try:
+                    res = cloud_http.get(self.token_url, params={
+                        'grant_type': 'client_credential',
+                        'appid': self.appid,
+                        'secret': self.secret
+                    }, timeout=10)
+                    res.raise_for_status()
+                    data = res.json()
+                    if 'access_token' not in data:
+                        raise RuntimeError(f"{data.get('errmsg')} (Code: {data.get('errcode')})")
+                except Exception as e:
+                    self.counters['failures'] += 1
+                    logging.error(f"Token刷新失败: {e}")
+                    return False
+                # 提前60秒视为过期，留出网络传输和时钟误差的余量
+                self.token = data['access_token']
+                self.expires_at = time.time() + data.get('expires_in', 7200) - 60
+                self._write_cache(self.token, self.expires_at)
+                self.counters['refreshes'] += 1
+                logging.info(f"Token刷新成功，有效期至：{time.ctime(self.expires_at)}")
+                return True
+
+    def _file_lock(self):
+        return FileLock(self.cache_file + '.lock')
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_file, encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return cached if cached.get('appid') == self.appid else {}
+
+    def _write_cache(self, token, expires_at):
+        """先写临时文件再替换，其他进程不会读到写了一半的内容；文件只允许当前用户读写"""
+        temp_path = f"{self.cache_file}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'appid': self.appid, 'access_token': token, 'expires_at': expires_at}, f)
+        os.chmod(temp_path, 0o600)
+        os.replace(temp_path, self.cache_file)
+
+    def start(self):
+        """启动后台主动刷新线程(可重复调用)"""
+        with self.cond:
+            if self.running:
+                return
+            self.running = True
+        self.thread = threading.Thread(target=self._refresh_loop, name="token-refresher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+
+    def _refresh_loop(self):
+        while True:
+            if self.expires_at - time.time() <= self.refresh_margin:
+                delay = self.retry_interval if not self.refresh(force=True) else 0
+            else:
+                delay = self.expires_at - self.refresh_margin - time.time()
+            with self.cond:
+                if delay > 0:
+                    self.cond.wait(delay)
+                if not self.running:
+                    return
+
+    def metrics(self):
+        return dict(self.counters, expires_in=max(0, int(self.expires_at - time.time())))
+
+
+class FileLock:
+    """基于 fcntl.flock 的跨进程排他锁"""
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self.file = open(self.path, 'a')
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def token_service(appid, secret, cache_file=DEFAULT_CACHE_FILE, start=True, token_url=TOKEN_URL):
+    """同一进程内按appid共享一个令牌服务，首次创建时启动后台刷新"""
+    with _services_lock:
+        service = _services.get(appid)
+        if service is None:
+            service = _services[appid] = TokenService(appid, secret, cache_file, token_url=token_url)
+        if start:
+            service.start()
+        return service
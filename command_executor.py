@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# 异步脚本指令执行器
+#
+# 远程下发的脚本与实时的坐姿检测运行在同一块板子上，执行器限制脚本能占用的资源：
+#   - 固定数量的工作协程从优先级队列取任务，同时运行的脚本不超过 workers
+#   - 排队数达到 queue_size 时，新任务挤掉优先级比它低的最新任务，否则被拒绝(asyncio.QueueFull)
+#   - 脚本经一个很小的启动器运行：启动器设置 nice 值和 CPU时间/内存(RLIMIT_CPU/RLIMIT_DATA)上限后
+#     exec 到脚本，超出CPU时间由内核终止。不使用 preexec_fn：服务进程中有事件循环之外的线程，
+#     fork 之后、exec 之前在子进程里执行Python代码可能死锁
+#   - CPU时间和内存默认不限：numpy/OpenBLAS/cv2 会按线程数预留大量虚拟内存，统一的上限容易误伤正常脚本；
+#     需要限制时在配置中设置上限，或由指令单独要求
+#   - 指令可以要求更严格的限制，但不能超过配置的上限，nice 只能调高
+#   - 标准输出/错误照常转发到终端，同时保留最后 tail_bytes 字节，随执行结果写回云端记录
+# 用 asyncio.create_subprocess_exec 启动和等待子进程，不阻塞事件循环。
+import sys
+import time
+import signal
+import asyncio
+import itertools
+
+try:
+    import resource
+except ImportError:                     # Windows 开发机上不支持资源限制，只限制并发数和超时
+    resource = None
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+PRIORITIES = {'high': PRIORITY_HIGH, 'normal': PRIORITY_NORMAL, 'low': PRIORITY_LOW}
+
+DEFAULT_LIMITS = {
+    'cpu_seconds': 0,                   # CPU时间上限(秒，0为不限)
+    'memory_mb': 0,                     # 数据段(堆和匿名映射)上限(MB，0为不限)
+    'nice': 10                          # 子进程的nice值(0~19，越大优先级越低)
+}
+
+
+def effective_limits(maximum, requested=None):
+    """合并配置上限与指令要求的限制：CPU和内存取较小值，nice取较大值"""
+    limits = dict(maximum)
+    for key in ('cpu_seconds', 'memory_mb'):
+        value = (requested or {}).get(key)
+        if isinstance(value, (int, float)) and value > 0:
+            limits[key] = min(value, limits[key]) if limits[key] > 0 else value
+    nice = (requested or {}).get('nice')
+    if isinstance(nice, int):
+        limits['nice'] = max(limits['nice'], min(nice, 19))
+    return limits
+
+
+# 启动器: python -c _LAUNCHER CPU秒数 内存字节数 nice 脚本路径
+# CPU软限制到达时收到SIGXCPU，多给1秒仍未退出则被SIGKILL；
+# 内存只限制数据段，不计入共享库和文件映射，比RLIMIT_AS更接近实际占用
+_LAUNCHER = (
+    "import os, sys, resource\n"
+    "cpu, memory, nice = (int(v) for v in sys.argv[1:4])\n"
+    "if nice > 0: os.nice(nice)\n"
+    "if cpu > 0: resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))\n"
+    "if memory > 0: resource.setrlimit(resource.RLIMIT_DATA, (memory, memory))\n"
+    "os.execv(sys.executable, [sys.executable] + sys.argv[4:])\n"
+)
+
+
+def _command(script_path, limits):
+    """返回运行脚本的命令行；支持资源限制时经启动器设置限制后再执行脚本"""
+    if resource is None:
+        return [sys.executable, script_path]
+    memory = int(limits['memory_mb'] * 1024 * 1024)
+    return [sys.executable, '-c', _LAUNCHER, str(int(limits['cpu_seconds'])), str(memory),
+            str(int(limits['nice'])), script_path]
+
+
+class _Tail:
+    """只保留最后 limit 字节的输出缓冲"""
+    def __init__(self, limit):
+        self.limit = limit
+        self.data = bytearray()
+        self.dropped = 0                      # 被丢弃的字节数
+
+    def write(self, chunk):
+        self.data += chunk
+        excess = len(self.data) - self.limit
+        if excess > 0:
+            del self.data[:excess]
+            self.dropped += excess
+
+    def text(self):
+        text = self.data.decode('utf-8', errors='replace')
+        return f"...(省略{self.dropped}字节)\n{text}" if self.dropped else text
+
+
+async def _pump(stream, tail, echo):
+    """读取子进程输出，写入尾部缓冲并转发到终端"""
+    while True:
+        chunk = await stream.read(4096)
+        if not chunk:
+            return
+        tail.write(chunk)
+        if echo is not None:
+            echo.write(chunk)
+            echo.flush()
+
+
+class AsyncCommandExecutor:
+    """按优先级排队、限制资源并发执行Python脚本指令"""
+    def __init__(self, workers=2, timeout=60, cwd=None, limits=None, queue_size=20, tail_bytes=2000):
+        self.workers = workers
+        self.timeout = timeout                # 单个脚本的最长运行时间(秒)
+        self.cwd = cwd
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))  # 资源限制上限
+        self.tail_bytes = tail_bytes          # 保留的输出尾部字节数
+        self.queue_size = queue_size
+        self.queue = asyncio.PriorityQueue()
+        self.waiting = []                     # 排队中(尚未开始)的任务，用于判断是否已满和挤掉低优先级任务
+        self.sequence = itertools.count()     # 同优先级按提交顺序执行
+        self.tasks = []
+        self.running = 0                      # 正在运行的脚本数
+        self.counters = {'submitted': 0, 'succeeded': 0, 'failed': 0, 'timeouts': 0, 'killed': 0, 'rejected': 0}
+
+    def start(self):
+        """在当前事件循环中启动工作协程"""
+        if not self.tasks:
+            self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def run_script(self, script_path, priority=PRIORITY_NORMAL, limits=None):
+        """提交脚本并等待执行结果(dict)；队列已满且没有可挤掉的任务时抛出 asyncio.QueueFull"""
+        self.start()
+        job = (priority, next(self.sequence), script_path, effective_limits(self.limits, limits),
+               asyncio.get_running_loop().create_future())
+        if len(self.waiting) >= self.queue_size:
+            victim = max(self.waiting, key=lambda item: item[:2])
+            if victim[:2] < job[:2]:
+                self.counters['rejected'] += 1
+                raise asyncio.QueueFull()
+            # 挤掉的任务仍留在队列中，工作协程取到已完成的future时直接跳过
+            self.waiting.remove(victim)
+            self.counters['rejected'] += 1
+            victim[-1].set_exception(asyncio.QueueFull())
+        self.waiting.append(job)
+        self.queue.put_nowait(job)
+        self.counters['submitted'] += 1
+        return await job[-1]
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            _, _, script_path, limits, future = job
+            if job in self.waiting:
+                self.waiting.remove(job)
+            try:
+                if not future.done():
+                    result = await self._execute(script_path, limits)
+                    if not future.done():
+                        future.set_result(result)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+    async def _execute(self, script_path, limits):
+        """运行一个脚本，返回状态、退出码、耗时和输出尾部"""
+        stdout, stderr = _Tail(self.tail_bytes), _Tail(self.tail_bytes)
+        start = time.monotonic()
+        process = await asyncio.create_subprocess_exec(
+            *_command(script_path, limits), cwd=self.cwd,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        self.running += 1
+        pumps = asyncio.gather(_pump(process.stdout, stdout, getattr(sys.stdout, 'buffer', None)),
+                               _pump(process.stderr, stderr, getattr(sys.stderr, 'buffer', None)))
+        status = None
+        try:
+            await asyncio.wait_for(process.wait(), self.timeout)
+        except asyncio.TimeoutError:
+            status = 'timeout'
+        finally:
+            self.running -= 1
+            # 超时或服务停止(任务被取消)时终止子进程
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            await pumps
+
+        returncode = process.returncode
+        if status is None:
+            if returncode == 0:
+                status = 'success'
+            elif returncode < 0:
+                status = 'killed'             # 被信号终止，如超出CPU时间(SIGXCPU/SIGKILL)
+            else:
+                status = 'failed'
+        self.counters[{'success': 'succeeded', 'timeout': 'timeouts'}.get(status, status)] += 1
+        result = {
+            'status': status,
+            'returncode': returncode,
+            'duration': round(time.monotonic() - start, 2),
+            'limits': limits,
+            'stdout_tail': stdout.text(),
+            'stderr_tail': stderr.text()
+        }
+        if returncode is not None and returncode < 0:
+            result['signal'] = signal.Signals(-returncode).name
+        return result
+
+    def metrics(self):
+        return dict(self.counters, queued=len(self.waiting), running=self.running)
+
+    async def stop(self):
+        """停止工作协程；正在运行的脚本被终止，排队的任务以取消结束"""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        for job in self.waiting:
+            job[-1].cancel()
+        self.waiting = []
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# 已执行指令记录(幂等账本)
+#
+# 云指令只按ID执行一次，重启或多个进程同时轮询时不会重复执行(尤其是 python: 脚本)：
+#   - 账本文件只追加，每行一条 "执行时间<TAB>指令ID"，桌面程序和坐姿监测共用同一个文件；
+#     release() 追加 "时间<TAB>指令ID<TAB>released"，撤销该指令的记录
+#   - 内存中保存ID集合，按执行顺序最多保留 max_entries 条，超过 ttl 秒的记录过期
+#   - claim() 持有文件锁，先读入其他进程追加的记录再判断和追加，多个进程之间也只有一个能执行
+#   - 失效的行超过有效记录数时重写文件(先写临时文件再替换)，首行写入新的版本标记，
+#     其他进程发现版本标记变化后重新读取
+# 指令在执行前记录，执行中途程序退出的指令不会再次执行(至多一次)；
+# 没有开始执行(如排队已满被拒绝)的指令撤销记录后，之后可以再次认领。
+import os
+import time
+import uuid
+import logging
+import threading
+import collections
+from cloud_token import FileLock
+
+DEFAULT_LEDGER_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'executed_commands.log')
+
+
+class CommandLedger:
+    """持久化的已执行指令ID集合，跨重启、跨进程去重"""
+    def __init__(self, path=DEFAULT_LEDGER_FILE, max_entries=5000, ttl=7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries        # 内存和文件中最多保留的记录数
+        self.ttl = ttl                        # 记录保留时间(秒)，过期的指令ID不再参与去重
+        self.entries = collections.OrderedDict()  # 指令ID -> 执行时间，按执行顺序
+        self.offset = 0                       # 已读入的文件长度
+        self.generation = None                # 已读入文件的版本标记，被其他进程压缩替换后需要重新读取
+        self.file_records = 0                 # 文件中的行数，用于决定何时压缩
+        self.counters = {'claimed': 0, 'duplicates': 0, 'released': 0, 'compactions': 0}
+        self.lock = threading.Lock()          # 进程内互斥，文件锁负责进程间互斥
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self.lock, self._file_lock():
+            self._sync()
+            self._expire()
+            self._compact()
+        if self.entries:
+            logging.info(f"已执行指令记录: {len(self.entries)}条")
+
+    def _file_lock(self):
+        return FileLock(self.path + '.lock')
+
+    def claim(self, cmd_id):
+        """第一次见到该指令时记录下来并返回True；已经执行过(包括其他进程)返回False"""
+        with self.lock, self._file_lock():
+            self._sync()
+            self._expire()
+            if cmd_id in self.entries:
+                self.counters['duplicates'] += 1
+                return False
+            now = time.time()
+            self._append(f"{now:.0f}\t{cmd_id}\n")
+            self._remember(cmd_id, now)
+            self.counters['claimed'] += 1
+            if self.file_records - len(self.entries) > max(100, len(self.entries)):
+                self._compact()
+            return True
+
+    def release(self, cmd_id):
+        """撤销认领：指令没有执行时调用，之后可以再次认领(包括其他进程)"""
+        with self.lock, self._file_lock():
+            self._sync()
+            if cmd_id not in self.entries:
+                return
+            self._append(f"{time.time():.0f}\t{cmd_id}\treleased\n")
+            del self.entries[cmd_id]
+            self.counters['released'] += 1
+
+    def _append(self, line):
+        """追加一行并落盘(调用方持有锁)"""
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+            # 持有文件锁期间没有其他进程写入，直接跳过自己追加的内容
+            self.offset = f.tell()
+        self.file_records += 1
+
+    def _sync(self):
+        """读入其他进程追加的记录(调用方持有锁)"""
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            self._reset(None)
+            return
+        with f:
+            header = f.readline()
+            generation = header.strip() if header.startswith(b'#') else b''
+            size = os.fstat(f.fileno()).st_size
+            if generation != self.generation or size < self.offset:
+                self._reset(generation)       # 文件被压缩替换或被删除后重建：从头读取
+            if size == self.offset:
+                return
+            f.seek(self.offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1          # 只处理完整的行，写了一半的行下次再读
+        for line in data[:end].decode('utf-8', errors='replace').splitlines():
+            executed_at, _, cmd_id = line.partition('\t')
+            cmd_id, _, flag = cmd_id.partition('\t')
+            try:
+                executed_at = float(executed_at)
+            except ValueError:
+                continue
+            if not cmd_id:
+                continue
+            self.file_records += 1
+            if flag == 'released':
+                self.entries.pop(cmd_id, None)
+            else:
+                self._remember(cmd_id, executed_at)
+        self.offset += end
+
+    def _reset(self, generation):
+        self.entries.clear()
+        self.offset = 0
+        self.file_records = 0
+        self.generation = generation
+
+    def _remember(self, cmd_id, executed_at):
+        self.entries.pop(cmd_id, None)
+        self.entries[cmd_id] = executed_at
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _expire(self):
+        """删除超过保留时间的记录(调用方持有锁)"""
+        cutoff = time.time() - self.ttl
+        while self.entries:
+            cmd_id, executed_at = next(iter(self.entries.items()))
+            if executed_at >= cutoff:
+                break
+            del self.entries[cmd_id]
+
+    def _compact(self):
+        """只保留仍有效的记录，先写临时文件再替换(调用方持有锁)"""
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        generation = uuid.uuid4().hex
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(f"# {generation}\n")
+            for cmd_id, executed_at in self.entries.items():
+                f.write(f"{executed_at:.0f}\t{cmd_id}\n")
+            f.flush()
+            os.fsync(f.fileno())
+            self.offset = f.tell()
+        os.replace(temp_path, self.path)
+        self.generation = f"# {generation}".encode('ascii')
+        self.file_records = len(self.entries)
+        self.counters['compactions'] += 1
+
+    def metrics(self):
+        with self.lock:
+            return dict(self.counters, entries=len(self.entries))
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+# 帧来源
+#
+# 姿势检测流水线只需要一个 read() -> (success, image) 接口，这里把各种输入统一成该接口：
+#   CameraSource         - 实时摄像头(按索引或自动检测)
+#   VideoFileSource      - 录制好的视频文件
+#   ImageDirectorySource - 按文件名排序的图片目录
+#   SyntheticSource      - 合成画面，用于在没有素材时测量流水线自身的开销
+# 回放类来源默认尽快产出帧(用于基准测试)，realtime=True 时按原始帧率节流(用于模拟摄像头)。
+import os
+import time
+import logging
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class FrameSource:
+    """帧来源基类，read() 与 cv2.VideoCapture.read 的返回值一致"""
+    def __init__(self, fps=0.0, realtime=False):
+        self.width = 0
+        self.height = 0
+        self.fps = fps                        # 标称帧率(Hz)，未知时为0
+        self.realtime = realtime              # 是否按标称帧率节流
+        self.finished = False                 # 回放来源读到末尾后为True
+        self.frame_index = -1                 # 最近一次读到的帧序号
+        self.start_time = 0
+
+    def open(self):
+        """打开来源，成功返回True"""
+        self.finished = False
+        self.frame_index = -1
+        self.start_time = time.perf_counter()
+        return True
+
+    def read(self):
+        success, image = self._read()
+        if not success:
+            return False, None
+        self.frame_index += 1
+        if self.width == 0:
+            self.height, self.width = image.shape[:2]
+        self._pace()
+        return True, image
+
+    def release(self):
+        pass
+
+    @property
+    def timestamp(self):
+        """最近一帧在素材中的时间(秒)，帧率未知时使用实际经过的时间"""
+        if self.fps > 0:
+            return self.frame_index / self.fps
+        return time.perf_counter() - self.start_time
+
+    def describe(self):
+        return type(self).__name__
+
+    def _read(self):
+        raise NotImplementedError
+
+    def _pace(self):
+        """realtime模式下等待到该帧在素材中的时间点"""
+        if self.realtime and self.fps > 0:
+            delay = self.start_time + self.frame_index / self.fps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+
+class CameraSource(FrameSource):
+    """实时摄像头；index为None时先尝试默认索引21，再依次检测0~4"""
+    def __init__(self, index=None, width=None, height=None, buffer_size=1):
+        super().__init__()
+        self.index = index
+        self.request_size = (width, height)
+        self.buffer_size = buffer_size
+        self.cap = None
+
+    def open(self):
+        index = self.index
+        if index is None:
+            index = self.find_camera()
+            if index is None:
+                logging.error("无法找到可用的摄像头")
+                return False
+        self.cap = cv2.VideoCapture(index)
+        if not self.cap.isOpened():
+            logging.error(f"无法打开摄像头索引: {index}")
+            return False
+        logging.info(f"成功打开摄像头索引: {index}")
+        self.index = index
+
+        # 设置采集分辨率
+        width, height = self.request_size
+        if width and height:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        logging.info(f"摄像头分辨率: {self.width}x{self.height}")
+        # 缩小驱动缓冲区，避免旧帧在V4L2缓冲中堆积
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size)
+        return super().open()
+
+    @staticmethod
+    def find_camera():
+        """自动检测可用的摄像头设备"""
+        for idx in (21, 0, 1, 2, 3, 4):
+            cap = cv2.VideoCapture(idx)
+            if cap.isOpened():
+                logging.info(f"成功打开摄像头索引: {idx}")
+                cap.release()
+                return idx
+        return None
+
+    def _read(self):
+        return self.cap.read()
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def describe(self):
+        return f"摄像头{self.index if self.index is not None else '(自动检测)'}"
+
+
+class VideoFileSource(FrameSource):
+    """视频文件回放"""
+    def __init__(self, path, loop=False, realtime=False):
+        super().__init__(realtime=realtime)
+        self.path = path
+        self.loop = loop
+        self.cap = None
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.path)
+        if not self.cap.isOpened():
+            logging.error(f"无法打开视频: {self.path}")
+            return False
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        return super().open()
+
+    def _read(self):
+        success, image = self.cap.read()
+        if not success and self.loop and self.frame_index >= 0:
+            # 循环播放：回到开头，帧序号继续累加
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, image = self.cap.read()
+        if not success:
+            self.finished = True
+        return success, image
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def describe(self):
+        return os.path.basename(self.path)
+
+
+class ImageDirectorySource(FrameSource):
+    """图片目录回放，文件按名称排序"""
+    def __init__(self, path, fps=10.0, loop=False, realtime=False):
+        super().__init__(fps=fps, realtime=realtime)
+        self.path = path
+        self.loop = loop
+        self.files = []
+        self.position = 0
+
+    def open(self):
+        try:
+            self.files = sorted(os.path.join(self.path, name) for name in os.listdir(self.path)
+                                if name.lower().endswith(IMAGE_EXTENSIONS))
+        except OSError as e:
+            logging.error(f"无法读取图片目录: {str(e)}")
+            return False
+        if not self.files:
+            logging.error(f"图片目录为空: {self.path}")
+            return False
+        self.position = 0
+        return super().open()
+
+    def _read(self):
+        while True:
+            if self.position >= len(self.files):
+                if not self.loop:
+                    self.finished = True
+                    return False, None
+                self.position = 0
+            path = self.files[self.position]
+            self.position += 1
+            image = cv2.imread(path)
+            if image is not None:
+                return True, image
+            logging.warning(f"无法读取图片，已跳过: {path}")
+
+    def describe(self):
+        return os.path.basename(os.path.normpath(self.path)) + "/"
+
+
+class SyntheticSource(FrameSource):
+    """合成画面：固定随机种子的噪声背景加移动色块，结果可复现"""
+    def __init__(self, width=640, height=480, frames=300, fps=30.0, seed=0, realtime=False):
+        super().__init__(fps=fps, realtime=realtime)
+        self.size = (width, height)
+        self.frames = frames                  # 总帧数，0表示无限
+        self.seed = seed
+        self.background = None
+
+    def open(self):
+        width, height = self.size
+        rng = np.random.default_rng(self.seed)
+        self.background = rng.integers(0, 64, (height, width, 3), dtype=np.uint8)
+        self.width, self.height = width, height
+        return super().open()
+
+    def _read(self):
+        index = self.frame_index + 1
+        if self.frames and index >= self.frames:
+            self.finished = True
+            return False, None
+        width, height = self.size
+        image = self.background.copy()
+        x = int((index * 7) % max(width - width // 4, 1))
+        y = height // 3
+        cv2.rectangle(image, (x, y), (x + width // 4, y + height // 2), (200, 180, 160), -1)
+        return True, image
+
+    def describe(self):
+        return f"合成画面 {self.size[0]}x{self.size[1]}"
+
+
+def open_source(spec, realtime=False, loop=False, image_fps=10.0):
+    """按描述字符串创建并打开帧来源，失败时抛出RuntimeError
+
+    支持的写法：
+      camera / camera:索引 / 纯数字     实时摄像头
+      synthetic[:宽x高[:帧数]]         合成画面
+      目录路径 (或 images:路径)         图片目录
+      其他 (或 video:路径)              视频文件
+    """
+    kind, _, value = spec.partition(':')
+    if spec.isdigit():
+        source = CameraSource(int(spec))
+    elif kind == 'camera':
+        source = CameraSource(int(value) if value else None)
+    elif kind == 'synthetic':
+        size, _, frames = value.partition(':')
+        width, height = (int(v) for v in size.lower().split('x')) if size else (640, 480)
+        source = SyntheticSource(width, height, int(frames) if frames else 300, realtime=realtime)
+    elif kind == 'images' or os.path.isdir(spec):
+        source = ImageDirectorySource(value if kind == 'images' else spec, image_fps, loop, realtime)
+    else:
+        source = VideoFileSource(value if kind == 'video' else spec, loop, realtime)
+    if not source.open():
+        raise RuntimeError(f"无法打开帧来源: {spec}")
+    return source
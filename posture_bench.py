@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+# 坐姿检测离线基准测试
+#
+# 用录制好的视频片段离线评估姿势检测流水线，不依赖摄像头和界面。
+#
+#   python posture_bench.py replay session1.mp4 [frames_dir/ synthetic ...] [--json result.json]
+#       用完整的姿势检测引擎尽快回放录制的会话：吞吐量、单帧耗时 p50/p95/p99、警告时间线
+#       指定 --baseline 时与之前保存的结果比较，性能退化超过容差时返回非零退出码
+#   python posture_bench.py resolution clip1.mp4 [clip2.mp4 ...] --inference-size 320x240
+#       对比全分辨率推理与降分辨率推理：关键点漂移、指标漂移、警告一致率和推理耗时
+# 素材可以是视频文件、图片目录或 synthetic[:宽x高[:帧数]] (见 frame_sources.open_source)
+import os
+os.environ['XNNPACK_DELEGATE'] = '0'  # 与主程序保持一致，禁用XNNPACK加速
+
+import sys
+import time
+import json
+import argparse
+import cv2
+import numpy as np
+from posture_metrics import DEFAULT_THRESHOLDS, PoseMetricsEngine, detect_warnings
+from posture_pose import fit_to_size, create_pose
+from frame_sources import open_source
+
+DRIFT_METRICS = ('spine_angle', 'avg_hip_angle', 'shoulder_diff', 'chin_height')
+
+
+def parse_size(text):
+    try:
+        width, height = (int(v) for v in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"分辨率格式应为 宽x高，例如 320x240: {text}")
+    return width, height
+
+
+def timed_landmarks(pose, engine, image):
+    """运行一次推理，返回 ((33,4)关键点数组或None, 耗时秒)"""
+    start = time.perf_counter()
+    results = pose.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    elapsed = time.perf_counter() - start
+    if not results.pose_landmarks:
+        return None, elapsed
+    return engine.load(results.pose_landmarks.landmark).copy(), elapsed
+
+
+def compare_resolution(path, inference_size, complexity, max_frames, min_visibility):
+    """逐帧对比全分辨率与降分辨率推理，返回统计结果字典"""
+    source = open_source(path)
+    full_pose, scaled_pose = create_pose(complexity), create_pose(complexity)
+    engine = PoseMetricsEngine()
+    stats = {
+        'frames': 0, 'both': 0, 'full_only': 0, 'scaled_only': 0, 'warnings_match': 0,
+        'pixel_error': [], 'full_time': [], 'scaled_time': [],
+        'metric_error': {name: [] for name in DRIFT_METRICS}
+    }
+    try:
+        while max_frames <= 0 or stats['frames'] < max_frames:
+            success, frame = source.read()
+            if not success:
+                break
+            stats['frames'] += 1
+            h, w = frame.shape[:2]
+            full, full_time = timed_landmarks(full_pose, engine, frame)
+            scaled, scaled_time = timed_landmarks(scaled_pose, engine, fit_to_size(frame, *inference_size))
+            stats['full_time'].append(full_time)
+            stats['scaled_time'].append(scaled_time)
+
+            if full is None or scaled is None:
+                if full is not None:
+                    stats['full_only'] += 1
+                elif scaled is not None:
+                    stats['scaled_only'] += 1
+                continue
+            stats['both'] += 1
+
+            # 以全分辨率结果中可见的关键点为准，换算成原图像素距离
+            visible = full[:, 3] >= min_visibility
+            delta = (scaled[visible, :2] - full[visible, :2]) * (w, h)
+            stats['pixel_error'].extend(np.hypot(delta[:, 0], delta[:, 1]).tolist())
+
+            full_metrics, scaled_metrics = engine.compute(full), engine.compute(scaled)
+            for name in DRIFT_METRICS:
+                stats['metric_error'][name].append(abs(full_metrics[name] - scaled_metrics[name]))
+            if detect_warnings(full_metrics, DEFAULT_THRESHOLDS) == detect_warnings(scaled_metrics, DEFAULT_THRESHOLDS):
+                stats['warnings_match'] += 1
+    finally:
+        source.release()
+        full_pose.close()
+        scaled_pose.close()
+    return stats
+
+
+def print_resolution_report(name, stats, inference_size):
+    frames = stats['frames']
+    print(f"\n== {name} ({frames} 帧, 推理分辨率 ≤{inference_size[0]}x{inference_size[1]}) ==")
+    if not frames:
+        print("  没有可用的帧")
+        return
+    print(f"  检测一致: 两者都检测到 {stats['both']}, 仅全分辨率 {stats['full_only']}, "
+          f"仅降分辨率 {stats['scaled_only']}")
+    full_ms = np.mean(stats['full_time']) * 1000
+    scaled_ms = np.mean(stats['scaled_time']) * 1000
+    print(f"  推理耗时: 全分辨率 {full_ms:.1f}ms, 降分辨率 {scaled_ms:.1f}ms ({full_ms / scaled_ms:.2f}x)")
+    if stats['pixel_error']:
+        error = np.array(stats['pixel_error'])
+        print(f"  关键点漂移(像素): 平均 {error.mean():.2f}, p50 {np.percentile(error, 50):.2f}, "
+              f"p95 {np.percentile(error, 95):.2f}, 最大 {error.max():.2f}")
+        for metric, values in stats['metric_error'].items():
+            print(f"  {metric:<14} 平均偏差 {np.mean(values):.4f}, p95 {np.percentile(values, 95):.4f}")
+        print(f"  警告判定一致率: {stats['warnings_match'] / stats['both'] * 100:.1f}%")
+
+
+def percentiles(values):
+    """返回耗时(毫秒)的 p50/p95/p99/最大值"""
+    if not values:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+    ms = np.array(values) * 1000
+    p50, p95, p99 = np.percentile(ms, (50, 95, 99))
+    return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99), 'max': float(ms.max())}
+
+
+def replay_source(engine, source, max_frames):
+    """把一个帧来源的所有帧依次送入引擎的推理阶段，返回统计结果字典"""
+    engine.reset_session()
+    read_times, frame_times = [], []
+    detected = 0
+    timeline = []                             # [(开始时间, 结束时间, 警告列表)]，时间为素材时间(秒)
+    current, current_start = (), 0.0
+    start = time.perf_counter()
+    try:
+        while max_frames <= 0 or len(frame_times) < max_frames:
+            t0 = time.perf_counter()
+            success, image = source.read()
+            t1 = time.perf_counter()
+            if not success:
+                if source.finished:
+                    break
+                continue
+            result = engine.process_frame(image)
+            frame_times.append(time.perf_counter() - t1)
+            read_times.append(t1 - t0)
+            if result['pose_landmarks']:
+                detected += 1
+
+            # 警告组合变化时结束上一段
+            warnings = tuple(result['posture_warnings'])
+            if warnings != current:
+                if current:
+                    timeline.append((current_start, source.timestamp, list(current)))
+                current, current_start = warnings, source.timestamp
+    finally:
+        elapsed = time.perf_counter() - start
+        source.release()
+    if current:
+        timeline.append((current_start, source.timestamp, list(current)))
+
+    frames = len(frame_times)
+    totals = {}
+    for seg_start, seg_end, warnings in timeline:
+        for warning in warnings:
+            totals[warning] = totals.get(warning, 0.0) + seg_end - seg_start
+    return {
+        'source': source.describe(),
+        'frames': frames,
+        'elapsed': elapsed,
+        'throughput': frames / elapsed if elapsed > 0 else 0.0,
+        'media_duration': source.timestamp if frames else 0.0,
+        'detection_rate': detected / frames if frames else 0.0,
+        'frame_ms': percentiles(frame_times),
+        'read_ms': percentiles(read_times),
+        'warning_seconds': totals,
+        'timeline': timeline
+    }
+
+
+def format_time(seconds):
+    return f"{int(seconds // 60):02d}:{seconds % 60:04.1f}"
+
+
+def print_replay_report(stats, show_timeline):
+    print(f"\n== {stats['source']} ({stats['frames']} 帧) ==")
+    if not stats['frames']:
+        print("  没有可用的帧")
+        return
+    speed = stats['media_duration'] / stats['elapsed'] if stats['elapsed'] > 0 else 0
+    print(f"  吞吐量: {stats['throughput']:.1f} 帧/秒 (素材时长 {stats['media_duration']:.1f}秒, {speed:.1f}x 实时)")
+    print(f"  检测率: {stats['detection_rate'] * 100:.1f}%")
+    for name, label in (('frame_ms', '单帧处理'), ('read_ms', '读取解码')):
+        p = stats[name]
+        print(f"  {label}(ms): p50 {p['p50']:.2f}, p95 {p['p95']:.2f}, p99 {p['p99']:.2f}, 最大 {p['max']:.2f}")
+    if stats['warning_seconds']:
+        summary = ", ".join(f"{name} {seconds:.1f}秒" for name, seconds in sorted(stats['warning_seconds'].items()))
+        print(f"  警告累计: {summary}")
+    else:
+        print("  警告累计: 无")
+    if show_timeline:
+        for seg_start, seg_end, warnings in stats['timeline']:
+            print(f"    {format_time(seg_start)} - {format_time(seg_end)}  {', '.join(warnings)}")
+
+
+def compare_baseline(results, baseline, tolerance):
+    """与基准结果逐个素材比较吞吐量和p95耗时，返回退化描述列表"""
+    previous = {item['source']: item for item in baseline.get('results', [])}
+    regressions = []
+    for stats in results:
+        base = previous.get(stats['source'])
+        if base is None or not stats['frames']:
+            continue
+        if stats['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(f"{stats['source']}: 吞吐量 {base['throughput']:.1f} -> {stats['throughput']:.1f} 帧/秒")
+        if stats['frame_ms']['p95'] > base['frame_ms']['p95'] * (1 + tolerance):
+            regressions.append(f"{stats['source']}: p95 {base['frame_ms']['p95']:.2f} -> {stats['frame_ms']['p95']:.2f} ms")
+        if stats['warning_seconds'].keys() != base['warning_seconds'].keys():
+            regressions.append(f"{stats['source']}: 警告类型 {sorted(base['warning_seconds'])} -> "
+                               f"{sorted(stats['warning_seconds'])}")
+    return regressions
+
+
+def cmd_replay(args):
+    # 引擎在导入时会初始化音频等设备，只在回放时才导入
+    import posture_engine
+    config = posture_engine.GLOBAL_CONFIG
+    config['model']['auto_select'] = False
+    config['model']['complexity'] = args.complexity
+    config['governor']['enabled'] = args.governor
+    config['roi']['enabled'] = not args.no_roi
+    config['resolution']['inference_width'], config['resolution']['inference_height'] = args.inference_size
+
+    # 离线引擎不创建上传、离线缓存、令牌和云指令轮询，不访问网络和线上状态文件
+    engine = posture_engine.PostureEngine(offline=True)
+    engine.voice_enabled = False
+    results = []
+    try:
+        for spec in args.sources:
+            source = open_source(spec, image_fps=args.image_fps)
+            # 每个素材使用新的模型实例，避免上一段的跟踪状态影响结果
+            engine.pose.close()
+            engine.pose = create_pose(args.complexity)
+            stats = replay_source(engine, source, args.max_frames)
+            print_replay_report(stats, args.timeline)
+            results.append(stats)
+    finally:
+        engine.shutdown()
+
+    report = {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'settings': {
+            'complexity': args.complexity,
+            'governor': args.governor,
+            'roi': not args.no_roi,
+            'inference_size': list(args.inference_size)
+        },
+        'results': results
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n结果已保存: {args.json}")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\n与基准相比出现退化:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\n与基准相比没有退化")
+    return 0
+
+
+def cmd_resolution(args):
+    for path in args.clips:
+        stats = compare_resolution(path, args.inference_size, args.complexity,
+                                   args.max_frames, args.min_visibility)
+        print_resolution_report(path, stats, args.inference_size)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="坐姿检测离线基准测试")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    replay = subparsers.add_parser('replay', help="用完整检测流水线回放录制的会话")
+    replay.add_argument('sources', nargs='+', help="视频文件、图片目录或 synthetic[:宽x高[:帧数]]")
+    replay.add_argument('--complexity', type=int, default=1, choices=(0, 1, 2),
+                        help="MediaPipe model_complexity (默认 1)")
+    replay.add_argument('--inference-size', type=parse_size, default=(320, 240),
+                        help="推理分辨率上限，格式 宽x高 (默认 320x240)")
+    replay.add_argument('--governor', action='store_true', help="启用推理调速(默认每帧都推理)")
+    replay.add_argument('--no-roi', action='store_true', help="关闭ROI跟踪推理")
+    replay.add_argument('--image-fps', type=float, default=10.0, help="图片目录的标称帧率 (默认 10)")
+    replay.add_argument('--max-frames', type=int, default=0, help="每个素材最多处理的帧数 (0为全部)")
+    replay.add_argument('--timeline', action='store_true', help="打印完整的警告时间线")
+    replay.add_argument('--json', help="把结果保存为JSON文件，可作为之后的 --baseline")
+    replay.add_argument('--baseline', help="之前保存的JSON结果，用于检测性能退化")
+    replay.add_argument('--tolerance', type=float, default=0.1, help="允许的退化比例 (默认 0.1)")
+    replay.set_defaults(func=cmd_replay)
+
+    resolution = subparsers.add_parser('resolution', help="对比降分辨率推理与全分辨率推理的精度漂移")
+    resolution.add_argument('clips', nargs='+', help="录制的视频文件或图片目录")
+    resolution.add_argument('--inference-size', type=parse_size, default=(320, 240),
+                            help="推理分辨率上限，格式 宽x高 (默认 320x240)")
+    resolution.add_argument('--complexity', type=int, default=1, choices=(0, 1, 2),
+                            help="MediaPipe model_complexity (默认 1)")
+    resolution.add_argument('--max-frames', type=int, default=0, help="每个片段最多处理的帧数 (0为全部)")
+    resolution.add_argument('--min-visibility', type=float, default=0.6,
+                            help="参与漂移统计的关键点最低可见度 (默认 0.6)")
+    resolution.set_defaults(func=cmd_resolution)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
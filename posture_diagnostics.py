@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# 流水线各阶段耗时统计
+#
+# 每个阶段的耗时保存在固定容量的环形缓冲区中(只保留最近 window 个样本)，
+# 记录一次只是一次数组写入，可以放在每帧都会执行的热路径上。
+# 汇总结果供界面诊断面板显示，也可以定期输出为结构化日志或JSON文件。
+import threading
+import numpy as np
+
+# 阶段名称及显示名称，按流水线顺序排列
+STAGES = (
+    ('read', '读取摄像头'),
+    ('resize', '缩放到推理分辨率'),
+    ('cvt_color', '颜色转换'),
+    ('pose', '姿势模型'),
+    ('metrics', '指标计算'),
+    ('display_resize', '缩放到显示尺寸'),
+    ('overlay', '叠加层绘制'),
+    ('qimage', 'QImage包装'),
+    ('scale', '显示绘制'),
+    ('encode', '截图编码')                  # 上传线程，不计入帧流水线
+)
+STAGE_LABELS = dict(STAGES)
+
+# 判断瓶颈时的阶段分组：采集、模型、渲染分别运行在不同线程
+STAGE_GROUPS = {
+    'camera': ('read',),
+    'model': ('resize', 'cvt_color', 'pose', 'metrics'),
+    'render': ('display_resize', 'overlay', 'qimage', 'scale')
+}
+GROUP_LABELS = {'camera': '摄像头', 'model': '模型推理', 'render': '渲染显示'}
+
+
+class RollingHistogram:
+    """固定容量的耗时样本环形缓冲区"""
+    def __init__(self, size):
+        self.samples = np.zeros(size, dtype=np.float64)
+        self.count = 0                        # 累计记录次数(可能超过容量)
+
+    def add(self, value):
+        self.samples[self.count % len(self.samples)] = value
+        self.count += 1
+
+    def values(self):
+        return self.samples[:min(self.count, len(self.samples))]
+
+    def summary(self):
+        """最近样本的统计(毫秒)"""
+        values = self.values() * 1000
+        if len(values) == 0:
+            return None
+        p50, p95, p99 = np.percentile(values, (50, 95, 99))
+        return {
+            'count': self.count,
+            'mean': round(float(values.mean()), 3),
+            'p50': round(float(p50), 3),
+            'p95': round(float(p95), 3),
+            'p99': round(float(p99), 3),
+            'max': round(float(values.max()), 3)
+        }
+
+
+class StageTimers:
+    """按阶段记录耗时，可被采集、推理、渲染和界面线程同时写入"""
+    def __init__(self, window=300, enabled=True):
+        self.window = window
+        self.enabled = enabled
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        if not self.enabled:
+            return
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(stage, RollingHistogram(self.window))
+        histogram.add(seconds)
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+    def snapshot(self):
+        """{阶段: 统计} ，按流水线顺序排列，只包含已有样本的阶段"""
+        with self.lock:
+            histograms = dict(self.histograms)
+        order = [name for name, _ in STAGES] + sorted(set(histograms) - set(STAGE_LABELS))
+        result = {}
+        for name in order:
+            if name in histograms:
+                summary = histograms[name].summary()
+                if summary is not None:
+                    result[name] = summary
+        return result
+
+
+def bottleneck(snapshot):
+    """根据各分组每帧平均耗时之和判断瓶颈，返回 (分组, 每帧毫秒) 或 None
+
+    三个分组在不同线程并行执行，整体帧率受耗时最长的分组限制。
+    """
+    totals = {}
+    for group, stages in STAGE_GROUPS.items():
+        means = [snapshot[stage]['mean'] for stage in stages if stage in snapshot]
+        if means:
+            totals[group] = sum(means)
+    if not totals:
+        return None
+    group = max(totals, key=totals.get)
+    return group, totals[group]
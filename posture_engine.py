@@ -0,0 +1,1823 @@
+# -*- coding: utf-8 -*-
+# 无界面坐姿监测引擎
+#
+# 摄像头采集、姿势检测、姿势状态机、语音提醒、截图上传和云指令轮询都在这里完成，
+# 只依赖 QtCore 的信号机制，不创建任何窗口部件，也不做 QImage/QPixmap 转换。
+# 图形界面(微信小程序+语音+坐姿1 .py)只是订阅引擎信号的瘦客户端；
+# 没有显示器的设备上可以直接以守护进程方式运行：
+#   python posture_engine.py [--camera 索引 | --source 视频/图片目录/synthetic] [--no-voice] [--no-cloud]
+import os
+os.environ['XNNPACK_DELEGATE'] = '0'  # 禁用XNNPACK加速
+
+import cv2
+import numpy as np
+import mediapipe as mp
+import time
+import cloud_http
+from cloud_token import TOKEN_ERRORS, TOKEN_URL, DEFAULT_CACHE_FILE, token_service
+from cloud_commands import CommandPoller, check_result, database_query
+from cloud_mock import apply_mock_endpoints
+from command_ledger import DEFAULT_LEDGER_FILE, CommandLedger
+import logging
+import json
+import threading
+import pygame
+import queue
+import collections
+import platform
+import signal
+import argparse
+import base64
+import hashlib
+from datetime import datetime
+from qcloud_cos import CosConfig, CosS3Client
+import sys
+from PySide6.QtCore import QCoreApplication, QTimer, Signal, QObject
+from posture_metrics import DEFAULT_THRESHOLDS, PoseMetricsEngine, detect_warnings
+from posture_pose import fit_to_size, create_pose
+from posture_overlay import OverlayRenderer
+from frame_sources import FrameSource, CameraSource, open_source
+from posture_diagnostics import StageTimers, bottleneck
+from posture_upload import UploadPool, UploadJob, RecordBatcher, PRIORITY_HIGH, PRIORITY_NORMAL
+from posture_spool import UploadSpool
+from posture_telemetry import build_skeleton_record
+
+try:
+    from turbojpeg import TurboJPEG
+except ImportError:
+    TurboJPEG = None
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# 全局配置
+GLOBAL_CONFIG = {
+    'poll_interval': 1,                 # 云指令轮询间隔(秒)，有新指令后使用该间隔
+    'poll_max_interval': 10,            # 空闲时轮询间隔逐渐放大到的上限(秒)
+    'poll_page_size': 10,               # 每页查询的指令数
+    'mark_retries': 3,                  # 标记指令完成失败后，在之后的轮询中重试的次数
+    'cloud_enabled': True,              # 是否启用云服务
+    'ledger': {                         # 已执行指令记录(与桌面程序共用，重启后不重复执行)
+        'file': DEFAULT_LEDGER_FILE,
+        'max_entries': 5000,            # 最多保留的指令ID数
+        'ttl': 7 * 24 * 3600            # 指令ID保留时间(秒)
+    },
+    'mock_server': '',                  # 本地模拟服务器地址(如 http://127.0.0.1:8765，见 cloud_mock.py)，为空时连接真实服务
+    
+    # 腾讯云 COS 配置
+    'cos': {
+        'SecretId': '',
+        'SecretKey': '',
+        'Region': 'ap-guangzhou',
+        'Bucket': '521-1355543084',
+        'Scheme': 'https',
+        'Domain': ''                    # 自定义访问域名，为空时使用 存储桶.cos.地域.myqcloud.com
+    },
+    
+    # 微信云开发配置
+    'wx_cloud': {
+        'env_id': 'cloud1-',
+        'token_cache': DEFAULT_CACHE_FILE,  # 访问令牌共享缓存文件(桌面程序与坐姿监测共用，后台提前刷新)
+        'token_url': TOKEN_URL,         # 获取访问令牌的接口
+        'api_url': 'https://api.weixin.qq.com/tcb/databasequery',  # 这是查询接口
+        'add_api_url': 'https://api.weixin.qq.com/tcb/databaseadd',  # 新增写入接口
+        'query_api_url': 'https://api.weixin.qq.com/tcb/databasequery',  # 保留查询接口
+        'appid': '',
+        'secret': '',
+        'collection_name': 'photo'
+    },
+    
+    # 姿势检测设置
+    'posture': {
+        **DEFAULT_THRESHOLDS,            # 各姿势的判定阈值(见 posture_metrics)
+        'min_visibility': 0.6,          # 关键点可见度阈值
+        'min_warnings': 2,               # 触发警告的最小异常姿势数量
+        'min_duration': 5,               # 触发截图的最小持续时间(秒)
+        'cooldown': 10                   # 两次截图的最小间隔(秒)
+    },
+    
+    # 语音提示设置
+    'voice': {
+        'min_alert_interval': 3.0,      # 同一种提醒的最小间隔(秒)
+        'min_warning_duration': 2.0,    # 触发提醒的最小持续时间(秒)
+        'cooldown_period': 5.0          # 全局提醒冷却时间(秒)
+    },
+
+    # 帧处理流水线设置
+    'pipeline': {
+        'queue_size': 1,                 # 级间队列容量(帧)，满时丢弃旧帧
+        'camera_buffer_size': 1,         # 摄像头驱动缓冲区大小(帧)
+        'poll_timeout': 0.2,             # 队列等待超时(秒)
+        'retry_interval': 0.1,           # 读帧失败后的重试间隔(秒)
+        'stop_timeout': 2.0              # 停止时等待线程退出的最长时间(秒)
+    },
+
+    # 推理调速设置
+    'governor': {
+        'enabled': True,                 # 是否启用自适应推理调速
+        'mode': 'cpu',                   # 'cpu': 限制CPU占用; 'rate': 保证最低结果频率
+        'max_cpu': 0.5,                  # 'cpu'模式下的CPU占用上限(单核比例)
+        'target_rate': 10.0,             # 'rate'模式下的目标结果频率(Hz)
+        'min_rate': 2.0,                 # 推理频率下限(Hz)
+        'max_rate': 30.0,                # 推理频率上限(Hz)
+        'headroom': 0.8,                 # CPU占用低于上限的该比例时提高频率
+        'step_up': 1.2,                  # 每次提高频率的倍数
+        'adjust_interval': 2.0,          # 调整间隔(秒)
+        'smoothing': 0.2                 # 耗时与帧率的滑动平均系数
+    },
+
+    # 文字叠加层设置
+    'overlay': {
+        'font_path': '/home/elf/main/SimHei.ttf',  # 中文字体文件
+        'sprite_cache_size': 512         # 文字贴图缓存数量
+    },
+
+    # ROI跟踪推理设置
+    'roi': {
+        'enabled': True,                 # 跟踪到人体后只对其周围区域推理
+        'margin': 0.25,                  # 关键点外框向外扩展的比例
+        'min_size': 0.3,                 # ROI最小边长(占画面边长的比例)
+        'min_visibility': 0.3,           # 参与外框计算的关键点最低可见度
+        'shrink_ratio': 0.6              # 新ROI面积小于当前该比例时才收缩
+    },
+
+    # 分辨率设置(None表示沿用摄像头分辨率)
+    'resolution': {
+        'capture_width': None,           # 摄像头采集宽度，截图使用该分辨率
+        'capture_height': None,          # 摄像头采集高度
+        'inference_width': 320,          # 送入姿势模型的最大宽度
+        'inference_height': 240,         # 送入姿势模型的最大高度
+        'display_width': None,           # 界面显示的最大宽度
+        'display_height': None           # 界面显示的最大高度
+    },
+
+    # 模型复杂度选择设置
+    'model': {
+        'auto_select': True,             # 首次启动时实测各复杂度耗时并自动选择
+        'complexity': 1,                 # 未启用自动选择或尚无测试结果时使用的复杂度
+        'candidates': [0, 1, 2],         # 参与测试的 model_complexity
+        'target_fps': 10.0,              # 所选模型需要达到的推理帧率(Hz)
+        'benchmark_frames': 20,          # 每个复杂度测试的帧数
+        'warmup_frames': 3,              # 不计入耗时的预热帧数
+        'cache_file': 'model_benchmark.json',  # 测试结果缓存文件
+        'upgrade_headroom': 0.7,         # 预测耗时低于目标间隔的该比例时才升级
+        'sustain_seconds': 10.0          # 负载变化持续该时间后才切换模型(秒)
+    },
+
+    # 性能诊断设置
+    'diagnostics': {
+        'enabled': True,                 # 是否记录各阶段耗时
+        'window': 300,                   # 每个阶段保留的最近样本数
+        'log_interval': 60.0,            # 输出结构化日志的间隔(秒)，0表示不输出
+        'dump_file': None                # 定期写入的JSON文件路径，None表示不写
+    },
+
+    # 界面显示设置
+    'display': {
+        'backend': 'raster',             # 'raster': 软件光栅绘制; 'opengl': QOpenGLWidget纹理上传(支持Mesa软件渲染)
+        'smooth_scaling': False,         # 缩小到显示尺寸时使用INTER_AREA(画质更好，开销更大)
+        'stats_refresh_hz': 5.0          # 帧率、持续时间等随时间变化的标签刷新频率(Hz)
+    },
+
+    # 截图上传队列
+    'upload': {
+        'workers': 1,                    # 上传工作线程数(固定，不随截图数量增加)
+        'queue_size': 8,                 # 排队任务上限，满时丢弃自动截图，手动截图挤掉最旧的自动截图
+        'max_retries': 3,                # 失败后最多重试次数
+        'backoff_base': 2.0,             # 第一次重试前等待的秒数，之后每次翻倍
+        'backoff_max': 60.0,             # 重试等待的上限(秒)
+        'artifact': 'photo',             # 'photo': 上传带水印的截图; 'skeleton': 只把量化骨架和指标写入数据库(几百字节，不上传照片)
+        'encoder': 'opencv',             # 截图JPEG编码器: 'opencv'(cv2.imencode) 或 'turbojpeg'(需安装PyTurboJPEG)
+        'profile': 'auto',               # 编码档位: 'auto' 按实测上传速度选择，或指定下面的档位名称
+        'default_profile': 'standard',   # 自动模式下还没有测速结果时使用的档位
+        'thumbnail_quality': 70,         # 缩略图JPEG质量
+        'throughput_smoothing': 0.3,     # 上传速度滑动平均系数(越大越跟随最近一次上传)
+        # max_dim: 长边上限(0为原始分辨率); thumbnail: 缩略图长边(0为不生成); min_throughput: 启用该档位的最低上传速度(KB/s)
+        'profiles': {
+            'full': {'max_dim': 0, 'quality': 95, 'thumbnail': 0, 'min_throughput': 1000},
+            'standard': {'max_dim': 1280, 'quality': 85, 'thumbnail': 320, 'min_throughput': 200},
+            'economy': {'max_dim': 640, 'quality': 70, 'thumbnail': 160, 'min_throughput': 0}
+        }
+    },
+
+    # 离线上传缓存(网络恢复后按顺序补传)
+    'spool': {
+        'enabled': True,
+        'dir': 'upload_spool',           # 缓存目录(截图文件和journal.log)
+        'max_bytes': 200 * 1024 * 1024,  # 容量上限，超出时淘汰最旧的截图
+        'retry_base': 5.0,               # 补传失败后首次等待的秒数，之后每次翻倍
+        'retry_max': 300.0,              # 补传等待的上限(秒)
+        'max_attempts': 10               # 同一条目因网络以外的原因失败该次数后改名为.failed，不再阻塞后续补传
+    },
+
+    # 数据库记录批量写入(databaseadd)
+    'records': {
+        'batch_size': 10,                # 每次请求最多写入的记录数
+        'batch_window': 2.0,             # 第一条记录到达后最多等待的秒数，期间到达的记录合并写入
+        'timeout': 20                    # 请求超时(秒)
+    }
+}
+
+# 新增：错误姿态类型到中文的映射
+POSTURE_CHINESE_MAP = {
+    "HUNCHBACK": "驼背",
+    "SLOUCHING": "坐姿倾斜",
+    "UNEVEN SHOULDERS": "肩部不平",
+    "TOO CLOSE": "距离过近",
+    "CROSSED LEGS": "二郎腿"
+}
+
+def use_mock_server(base_url):
+    """把微信接口和COS地址指向本地模拟服务器"""
+    GLOBAL_CONFIG['mock_server'] = base_url
+    apply_mock_endpoints(base_url, GLOBAL_CONFIG['wx_cloud'], GLOBAL_CONFIG['cos'])
+
+if GLOBAL_CONFIG['mock_server']:
+    use_mock_server(GLOBAL_CONFIG['mock_server'])
+
+def cloud_token_service():
+    """进程内共享的访问令牌服务"""
+    cfg = GLOBAL_CONFIG['wx_cloud']
+    return token_service(cfg['appid'], cfg['secret'], cfg['token_cache'], token_url=cfg['token_url'])
+
+# ================== 全局状态管理 ==================
+class GlobalState(QObject):
+    status_update = Signal(str, str)
+    command_executed = Signal(str, str)
+    
+    def __init__(self, cloud=True):
+        super().__init__()
+        self.virtual_led = False               # 虚拟LED状态
+        self.camera_active = False             # 摄像头是否激活
+        self.capture_requested = False         # 截图请求标志
+        self.last_command = {                 # 最近执行的指令
+            'id': None,                       # 指令ID
+            'content': None,                  # 指令内容
+            'timestamp': 0,                   # 执行时间戳
+            'source': "none"                  # 指令来源
+        }
+        self.lock = threading.Lock()          # 状态锁
+        self.cloud_poller_active = True       # 云轮询器是否激活
+        self.poller_stop = threading.Event()
+        # cloud=False(离线回放)时不创建令牌服务、指令记录和轮询器
+        self.tokens = None
+        self.ledger = None
+        self.command_poller = None
+        if cloud:
+            self.tokens = cloud_token_service()   # 与引擎共用的访问令牌服务
+            self.ledger = CommandLedger(GLOBAL_CONFIG['ledger']['file'], GLOBAL_CONFIG['ledger']['max_entries'],
+                                        GLOBAL_CONFIG['ledger']['ttl'])
+            self.command_poller = CommandPoller(
+                lambda query: database_query(GLOBAL_CONFIG['wx_cloud']['api_url'],
+                                             GLOBAL_CONFIG['wx_cloud']['env_id'], self.tokens, query),
+                page_size=GLOBAL_CONFIG['poll_page_size'],
+                min_interval=GLOBAL_CONFIG['poll_interval'],
+                max_interval=GLOBAL_CONFIG['poll_max_interval']
+            )
+        
+    def is_duplicate_command(self, command_data: dict) -> bool:
+        """检查是否为重复指令；不是时记入已执行指令记录"""
+        current_cmd_id = command_data.get('_id', '')
+        current_cmd = command_data.get('command', '')
+        
+        # 云指令按ID去重，已执行指令记录跨重启保存，并与桌面程序共用
+        if current_cmd_id:
+            if not self.ledger.claim(current_cmd_id):
+                logging.info(f"跳过已执行的指令: {current_cmd}")
+                return True
+            return False
+        
+        # 如果指令ID和内容都与上次相同，则认为是重复指令
+        if (current_cmd_id == self.last_command['id'] and 
+            current_cmd == self.last_command['content']):
+            logging.info(f"跳过重复指令: {current_cmd}")
+            return True
+        return False
+        
+    def update_last_command(self, command_data, source="cloud"):
+        """更新最后执行的指令信息"""
+        with self.lock:
+            self.last_command = {
+                'id': command_data.get('_id', ''),
+                'content': command_data.get('command', ''),
+                'timestamp': time.time(),
+                'source': source
+            }
+            self.command_executed.emit(self.last_command['content'], source)
+            
+    def update_status(self, text, color):
+        """更新状态信息"""
+        self.status_update.emit(text, color)
+        
+    def start_cloud_poller(self):
+        """启动云指令轮询器"""
+        if GLOBAL_CONFIG['cloud_enabled'] and self.command_poller is not None:
+            self.cloud_poller_active = True
+            self.poller_stop = threading.Event()    # 每个轮询线程使用自己的停止事件
+            self.cloud_poller_thread = threading.Thread(
+                target=self.run_cloud_poller,
+                daemon=True
+            )
+            self.cloud_poller_thread.start()
+            logging.info("云指令轮询已启动")
+    
+    def stop_cloud_poller(self):
+        """停止云指令轮询器"""
+        self.cloud_poller_active = False
+        self.poller_stop.set()
+        logging.info("云指令轮询已停止")
+        
+    def run_cloud_poller(self):
+        """运行云指令轮询器：有新指令后快速轮询，空闲或出错时逐渐放慢"""
+        stop = self.poller_stop
+        while not stop.is_set():
+            commands = []
+            try:
+                commands = self.poll_cloud_commands()
+                for cmd in commands:
+                    self.execute_command(cmd)
+            except Exception as e:
+                logging.error(f"云指令轮询错误: {e}")
+                self.update_status(f"云指令轮询错误: {e}", "#f44336")
+            stop.wait(self.command_poller.next_interval(bool(commands)))
+            
+    def poll_cloud_commands(self):
+        """从微信云开发增量查询游标之后的未完成指令"""
+        try:
+            return self.command_poller.fetch()
+        except Exception as e:
+            logging.error(f"查询指令失败: {e}")
+            return []
+
+    def mark_command_executed(self, cmd_id):
+        """标记云指令为已执行状态，返回是否成功(检查云开发错误码)"""
+        try:
+            access_token = self.tokens.get_token()
+            res = cloud_http.post(
+                f"{GLOBAL_CONFIG['wx_cloud']['api_url']}?access_token={access_token}",
+                json={
+                    "env": GLOBAL_CONFIG['wx_cloud']['env_id'],
+                    "query": f"db.collection('commands').doc('{cmd_id}').update({{data:{{status:'completed'}}}})"
+                },
+                timeout=10
+            )
+            res.raise_for_status()
+            check_result(res.json(), self.tokens, access_token)
+            return True
+        except Exception as e:
+            logging.error(f"标记指令失败: {e}")
+            return False
+
+    def retry_mark(self, command_data):
+        """已执行但标记失败的指令放回轮询器，下一轮作为重复指令补上标记，不会再次执行"""
+        if not self.command_poller.requeue(command_data, GLOBAL_CONFIG['mark_retries']):
+            logging.warning(f"多次标记失败，放弃标记指令: {command_data.get('_id', '')}")
+            
+    camera_control_needed = Signal(bool)  # 新增信号：True=启动，False=停止
+    def execute_command(self, command_data, source="cloud"):
+        command = command_data.get('command', '')
+        cmd_id = command_data.get('_id', '')
+        
+        # 只处理本程序负责的指令，其他指令(如桌面程序的python:脚本)留给对应程序记录和标记完成
+        if command not in ('start_camera', 'stop_camera', 'capture'):
+            return
+
+        # 检查是否为重复指令；之前执行过但没来得及标记的指令补上标记
+        if self.is_duplicate_command(command_data):
+            if source == "cloud" and cmd_id and not self.mark_command_executed(cmd_id):
+                self.retry_mark(command_data)
+            return
+
+        # 使用信号触发摄像头控制 (确保线程安全)
+        try:
+            if command == 'start_camera':
+                self.camera_control_needed.emit(True)
+            elif command == 'stop_camera':
+                self.camera_control_needed.emit(False)
+            elif command == 'capture':
+                with self.lock:
+                    self.capture_requested = True
+                logging.info("收到截图指令，已设置截图标志")
+        except Exception as e:
+            # 没有执行成功的指令撤销记录并保持未完成状态，之后可以再次执行
+            logging.error(f"执行指令失败: {command}: {e}")
+            if cmd_id:
+                self.ledger.release(cmd_id)
+            return
+        # 更新最后执行的指令信息
+        self.update_last_command(command_data, source)
+
+        # 标记云指令为已执行；失败时在之后的轮询中补标记
+        if source == "cloud" and cmd_id and not self.mark_command_executed(cmd_id):
+            self.retry_mark(command_data)
+# ================== 语音提醒类 ==================
+class VoiceAlerts:
+    def __init__(self):
+        self.alert_timers = {
+            "HUNCHBACK": 0,
+            "SLOUCHING": 0,
+            "UNEVEN SHOULDERS": 0,
+            "TOO CLOSE": 0,
+            "CROSSED LEGS": 0
+        }
+        self.last_alert_time = 0
+        self.mixer_ready = None               # 音频设备在第一次播放时才初始化，失败后不再重试
+        self.alert_queue = queue.Queue()
+        self.alert_thread = threading.Thread(target=self._process_alerts)
+        self.alert_thread.daemon = True
+        self.alert_thread.start()
+        
+    def _process_alerts(self):
+        while True:
+            alert_type = self.alert_queue.get()
+            if alert_type is None:
+                break
+                
+            current_time = time.time()
+            if current_time - self.last_alert_time < GLOBAL_CONFIG['voice']['cooldown_period']:
+                continue
+                
+            self._play_alert(alert_type)
+            self.last_alert_time = current_time
+            
+    def _init_mixer(self):
+        """初始化pygame音频(只在真正需要播放时调用)，没有音频设备时关闭语音提醒"""
+        if self.mixer_ready is None:
+            # 确保 alerts 文件夹存在
+            if not os.path.exists("alerts"):
+                os.makedirs("alerts")
+                logging.info("已创建 alerts 文件夹，请将语音文件放入其中")
+            try:
+                pygame.mixer.init()
+                self.mixer_ready = True
+            except Exception as e:
+                logging.error(f"音频设备初始化失败，语音提醒不可用: {e}")
+                self.mixer_ready = False
+        return self.mixer_ready
+
+    def _play_alert(self, alert_type):
+        if not self._init_mixer():
+            return
+        try:
+            file_map = {
+                "HUNCHBACK": "hunchback.wav",
+                "SLOUCHING": "slouching.wav",
+                "UNEVEN SHOULDERS": "uneven_shoulders.wav",
+                "TOO CLOSE": "too_close.wav",
+                "CROSSED LEGS": "crossed_legs.wav"
+            }
+            
+            filename = file_map.get(alert_type)
+            if filename:
+                sound = pygame.mixer.Sound(f"alerts/{filename}")
+                sound.play()
+                logging.info(f"播放语音提醒: {alert_type}")
+        except Exception as e:
+            logging.error(f"播放语音错误: {e}")
+    
+    def add_alert(self, alert_type):
+        current_time = time.time()
+        if current_time - self.alert_timers[alert_type] > GLOBAL_CONFIG['voice']['min_alert_interval']:
+            self.alert_queue.put(alert_type)
+            self.alert_timers[alert_type] = current_time
+    
+    def stop(self):
+        self.alert_queue.put(None)
+        self.alert_thread.join()
+
+# ================== 帧处理流水线 ==================
+class LatestFrameQueue:
+    """有界的最新帧队列：队列已满时丢弃最旧的帧，保证下游总是拿到最新数据"""
+    def __init__(self, maxsize=1):
+        self.items = collections.deque(maxlen=maxsize)
+        self.cond = threading.Condition()
+        self.closed = False
+        self.dropped = 0                      # 因队列已满而被丢弃的帧数
+
+    def put(self, item):
+        with self.cond:
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+            self.items.append(item)
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        """取出最旧的一帧，超时或队列关闭时返回None"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.items or self.closed, timeout)
+            if not self.items:
+                return None
+            return self.items.popleft()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.items.clear()
+            self.cond.notify_all()
+
+class FramePipeline:
+    """采集 → 推理 → 渲染 三级流水线
+
+    每一级运行在独立线程中，级与级之间通过 LatestFrameQueue 连接。
+    推理变慢时旧帧会被直接丢弃，端到端延迟不会随积压增长。
+    """
+    def __init__(self, read_frame, infer, render, on_error=None, is_finished=None, on_end=None, timers=None):
+        self.read_frame = read_frame          # 采集函数: () -> (success, image)
+        self.infer = infer                    # 推理函数: image -> result (返回None表示丢弃)
+        self.render = render                  # 渲染函数: result -> None
+        self.on_error = on_error              # 采集失败回调
+        self.is_finished = is_finished        # 回放来源是否已读完: () -> bool
+        self.on_end = on_end                  # 回放结束回调
+        self.timers = timers                  # 阶段耗时统计(StageTimers)
+        queue_size = GLOBAL_CONFIG['pipeline']['queue_size']
+        self.capture_queue = LatestFrameQueue(queue_size)
+        self.render_queue = LatestFrameQueue(queue_size)
+        self.running = threading.Event()
+        self.latest_frame = None              # 最近一次采集到的原始帧
+        self.threads = []
+
+    def start(self):
+        self.running.set()
+        self.threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._inference_loop, name="inference", daemon=True),
+            threading.Thread(target=self._render_loop, name="render", daemon=True)
+        ]
+        for t in self.threads:
+            t.start()
+
+    def stop(self):
+        self.running.clear()
+        self.capture_queue.close()
+        self.render_queue.close()
+        for t in self.threads:
+            if t is not threading.current_thread():
+                t.join(timeout=GLOBAL_CONFIG['pipeline']['stop_timeout'])
+        self.threads = []
+
+    def _capture_loop(self):
+        """采集线程：持续读取摄像头，及时清空驱动缓冲区"""
+        while self.running.is_set():
+            read_start = time.perf_counter()
+            success, image = self.read_frame()
+            if not success:
+                if self.is_finished and self.is_finished():
+                    if self.on_end:
+                        self.on_end()
+                    break
+                if self.on_error:
+                    self.on_error()
+                time.sleep(GLOBAL_CONFIG['pipeline']['retry_interval'])
+                continue
+            if self.timers:
+                self.timers.record('read', time.perf_counter() - read_start)
+            self.latest_frame = image
+            self.capture_queue.put(image)
+
+    def _inference_loop(self):
+        """推理线程：只处理最新的一帧"""
+        while self.running.is_set():
+            image = self.capture_queue.get(timeout=GLOBAL_CONFIG['pipeline']['poll_timeout'])
+            if image is None:
+                continue
+            try:
+                result = self.infer(image)
+            except Exception as e:
+                logging.error(f"推理阶段出错: {e}")
+                continue
+            if result is not None:
+                self.render_queue.put(result)
+
+    def _render_loop(self):
+        """渲染线程：绘制叠加层并生成可显示的图像"""
+        while self.running.is_set():
+            result = self.render_queue.get(timeout=GLOBAL_CONFIG['pipeline']['poll_timeout'])
+            if result is None:
+                continue
+            try:
+                self.render(result)
+            except Exception as e:
+                logging.error(f"渲染阶段出错: {e}")
+
+class InferenceGovernor:
+    """推理调速器：根据实测推理耗时和CPU占用选择推理频率与跳帧比例
+
+    两种目标模式：
+      'cpu'  - 在进程CPU占用不超过 max_cpu (单核比例) 的前提下尽量提高推理频率
+      'rate' - 保证至少 target_rate Hz 的检测结果，多余的算力不用于推理
+    """
+    def __init__(self):
+        cfg = GLOBAL_CONFIG['governor']
+        self.rate = cfg['max_rate']           # 当前推理频率(Hz)
+        self.skip = 1                         # 跳帧比例：每skip帧推理一次
+        self.latency = 0.0                    # 推理耗时滑动平均(秒)
+        self.cpu_load = 0.0                   # 进程CPU占用(单核比例)
+        self.frame_rate = 0.0                 # 输入帧率滑动平均(Hz)
+        self.frame_count = 0
+        self.last_frame_time = 0
+        self.last_adjust_time = time.time()
+        self.last_cpu_time = time.process_time()
+
+    def should_infer(self, now):
+        """记录一帧输入，返回该帧是否需要推理"""
+        if self.last_frame_time:
+            self._smooth('frame_rate', 1.0 / max(now - self.last_frame_time, 1e-3))
+        self.last_frame_time = now
+        self.frame_count += 1
+        if not GLOBAL_CONFIG['governor']['enabled']:
+            return True
+        return self.frame_count % self.skip == 0
+
+    def record_inference(self, latency):
+        self._smooth('latency', latency)
+
+    def adjust(self, now):
+        """周期性重新计算推理频率，频率或跳帧比例变化时返回True"""
+        cfg = GLOBAL_CONFIG['governor']
+        elapsed = now - self.last_adjust_time
+        if not cfg['enabled'] or elapsed < cfg['adjust_interval']:
+            return False
+        cpu_time = time.process_time()
+        self.cpu_load = (cpu_time - self.last_cpu_time) / elapsed
+        self.last_cpu_time = cpu_time
+        self.last_adjust_time = now
+
+        # 推理线程串行执行，频率上限受单次推理耗时限制
+        max_rate = cfg['max_rate']
+        if self.latency > 0:
+            max_rate = min(max_rate, 1.0 / self.latency)
+
+        if cfg['mode'] == 'rate':
+            rate = cfg['target_rate']
+        elif self.cpu_load > cfg['max_cpu']:
+            # 按超出比例降低频率
+            rate = self.rate * cfg['max_cpu'] / self.cpu_load
+        elif self.cpu_load < cfg['max_cpu'] * cfg['headroom']:
+            rate = self.rate * cfg['step_up']
+        else:
+            rate = self.rate
+        rate = max(cfg['min_rate'], min(rate, max_rate))
+
+        skip = 1
+        if self.frame_rate > 0:
+            skip = max(1, int(round(self.frame_rate / rate)))
+        changed = skip != self.skip or abs(rate - self.rate) >= 0.5
+        self.rate = rate
+        self.skip = skip
+        return changed
+
+    def _smooth(self, name, value):
+        alpha = GLOBAL_CONFIG['governor']['smoothing']
+        current = getattr(self, name)
+        setattr(self, name, value if current == 0 else current * (1 - alpha) + value * alpha)
+
+class RoiTracker:
+    """推理ROI跟踪：已跟踪到人体时只裁剪其外框(加边距)区域送入模型
+
+    ROI只在关键点接近边缘或人体明显变小时才更新，保持裁剪区域稳定，
+    避免MediaPipe内部的逐帧跟踪因输入区域抖动而失效。
+    """
+    def __init__(self):
+        self.roi = None                       # (x0, y0, x1, y1) 像素坐标，None表示全帧推理
+        self.frame_size = None                # 计算ROI时的画面尺寸
+
+    def reset(self):
+        self.roi = None
+
+    def current(self, width, height):
+        """返回可用于该尺寸画面的ROI，画面尺寸变化(如切换帧来源)时作废"""
+        if self.frame_size != (width, height):
+            self.roi = None
+        return self.roi
+
+    def update(self, landmarks, width, height):
+        """根据全帧归一化坐标的 (33,4) 关键点数组更新ROI"""
+        cfg = GLOBAL_CONFIG['roi']
+        self.frame_size = (width, height)
+        if not cfg['enabled']:
+            self.roi = None
+            return
+        visible = landmarks[landmarks[:, 3] >= cfg['min_visibility'], :2]
+        if len(visible) == 0:
+            self.roi = None
+            return
+        x_min, y_min = np.clip(visible.min(axis=0), 0, 1) * (width, height)
+        x_max, y_max = np.clip(visible.max(axis=0), 0, 1) * (width, height)
+
+        # 关键点仍在当前ROI内部(留有半个边距)时保持不变
+        if self.roi is not None:
+            rx0, ry0, rx1, ry1 = self.roi
+            pad_x = (x_max - x_min) * cfg['margin'] / 2
+            pad_y = (y_max - y_min) * cfg['margin'] / 2
+            inside = (x_min - pad_x >= rx0 and y_min - pad_y >= ry0 and
+                      x_max + pad_x <= rx1 and y_max + pad_y <= ry1)
+        else:
+            inside = False
+
+        # 外框向外扩展并保证最小尺寸
+        box_w = max((x_max - x_min) * (1 + 2 * cfg['margin']), width * cfg['min_size'])
+        box_h = max((y_max - y_min) * (1 + 2 * cfg['margin']), height * cfg['min_size'])
+        cx, cy = (x_min + x_max) / 2, (y_min + y_max) / 2
+        x0 = int(max(0, min(cx - box_w / 2, width - box_w)))
+        y0 = int(max(0, min(cy - box_h / 2, height - box_h)))
+        roi = (x0, y0, int(min(width, x0 + box_w)), int(min(height, y0 + box_h)))
+
+        if inside:
+            area = (roi[2] - roi[0]) * (roi[3] - roi[1])
+            current = (self.roi[2] - self.roi[0]) * (self.roi[3] - self.roi[1])
+            if area >= current * cfg['shrink_ratio']:
+                return
+        self.roi = roi
+
+class ModelSelector:
+    """模型复杂度选择与热切换
+
+    首次启动时在后台线程用实际摄像头画面测试各复杂度的单帧推理耗时(含缩放和颜色转换，与调速器的统计口径一致)，
+    结果按设备和推理分辨率缓存到磁盘；所有复杂度都测试失败时记为失败，不再重复测试。
+    之后选择能达到目标帧率的最精确模型；运行中推理耗时持续偏离测试结果时，
+    按当前负载重新预测各模型耗时并在后台加载新模型，推理线程在下一帧直接替换，无需重启摄像头。
+    """
+    def __init__(self):
+        cfg = GLOBAL_CONFIG['model']
+        resolution = GLOBAL_CONFIG['resolution']
+        self.cache_key = (f"{platform.node()}-{platform.machine()}-"
+                          f"{resolution['inference_width']}x{resolution['inference_height']}")
+        self.latencies = self._load_cache()   # {复杂度: 单帧耗时(秒)}
+        self.complexity = self.choose() if self.latencies else cfg['complexity']
+        self.samples = []                     # 等待测试的样本帧(原始分辨率)
+        self.benchmark_state = None           # 测试状态: None 未测试 / 'running' / 'done' / 'failed'
+        self.lock = threading.Lock()
+        self.loading = False                  # 是否正在后台加载新模型
+        self.pending = None                   # 已加载完成、等待替换的 (复杂度, 模型)
+        self.overload_since = 0               # 持续过载的开始时间
+        self.headroom_since = 0               # 持续有余量的开始时间
+
+    @property
+    def needs_benchmark(self):
+        return GLOBAL_CONFIG['model']['auto_select'] and not self.latencies and self.benchmark_state is None
+
+    def _load_cache(self):
+        try:
+            with open(GLOBAL_CONFIG['model']['cache_file'], 'r', encoding='utf-8') as f:
+                entry = json.load(f).get(self.cache_key, {})
+            return {int(c): latency for c, latency in entry.get('latencies', {}).items()}
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logging.warning(f"读取模型测试缓存失败: {str(e)}")
+            return {}
+
+    def _save_cache(self):
+        path = GLOBAL_CONFIG['model']['cache_file']
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        cache[self.cache_key] = {
+            'latencies': {str(c): latency for c, latency in self.latencies.items()},
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, indent=2, ensure_ascii=False)
+        except OSError as e:
+            logging.warning(f"保存模型测试缓存失败: {str(e)}")
+
+    def collect(self, image):
+        """收集一帧原始分辨率的样本，样本足够时返回True"""
+        self.samples.append(image.copy())
+        return len(self.samples) >= GLOBAL_CONFIG['model']['benchmark_frames']
+
+    def start_benchmark(self):
+        """在后台线程测试收集到的样本并加载选中的模型，测试期间推理线程继续使用当前模型"""
+        if self.loading or self.benchmark_state is not None:
+            return
+        samples, self.samples = self.samples, []
+        self.benchmark_state = 'running'
+        self.loading = True
+
+        def benchmark():
+            try:
+                latencies = self.run_benchmark(samples)
+            except Exception as e:
+                logging.error(f"模型性能测试失败: {str(e)}")
+                latencies = {}
+            if not latencies:
+                self.benchmark_state = 'failed'
+                self.loading = False
+                logging.warning(f"所有复杂度的模型测试均失败，继续使用复杂度{self.complexity}")
+                return
+            self.latencies = latencies
+            self._save_cache()
+            self.benchmark_state = 'done'
+            complexity = self.choose()
+            if complexity == self.complexity:
+                self.loading = False
+            else:
+                self._load(complexity)
+
+        threading.Thread(target=benchmark, name="model-loader", daemon=True).start()
+
+    def run_benchmark(self, samples):
+        """测试各复杂度的单帧耗时，返回 {复杂度: 耗时(秒)}
+
+        每帧的计时与推理线程相同：缩小到推理分辨率 + 颜色转换 + 模型推理。
+        """
+        cfg = GLOBAL_CONFIG['model']
+        resolution = GLOBAL_CONFIG['resolution']
+        latencies = {}
+        for complexity in cfg['candidates']:
+            try:
+                pose = create_pose(complexity)
+            except Exception as e:
+                logging.warning(f"无法加载复杂度{complexity}的模型: {str(e)}")
+                continue
+            timings = []
+            try:
+                for i, image in enumerate(samples):
+                    start = time.perf_counter()
+                    region = fit_to_size(image, resolution['inference_width'], resolution['inference_height'])
+                    pose.process(cv2.cvtColor(region, cv2.COLOR_BGR2RGB))
+                    if i >= cfg['warmup_frames']:
+                        timings.append(time.perf_counter() - start)
+            except Exception as e:
+                logging.warning(f"复杂度{complexity}的模型测试失败: {str(e)}")
+                timings = []
+            finally:
+                pose.close()
+            if timings:
+                latencies[complexity] = float(np.median(timings))
+                logging.info(f"模型复杂度{complexity}: 单帧耗时 {latencies[complexity]*1000:.1f}ms")
+        return latencies
+
+    def choose(self, load=1.0):
+        """选择预测耗时满足目标帧率的最高复杂度；都不满足时选最快的模型"""
+        interval = 1.0 / GLOBAL_CONFIG['model']['target_fps']
+        if not self.latencies:
+            return self.complexity
+        best = min(self.latencies, key=self.latencies.get)
+        for complexity in sorted(self.latencies):
+            if self.latencies[complexity] * load <= interval:
+                best = complexity
+        return best
+
+    def observe(self, latency, now):
+        """根据实测推理耗时判断是否需要切换模型，需要时返回新的复杂度"""
+        cfg = GLOBAL_CONFIG['model']
+        if not cfg['auto_select'] or self.complexity not in self.latencies or self.loading or latency <= 0:
+            return None
+        interval = 1.0 / cfg['target_fps']
+        load = latency / self.latencies[self.complexity]   # 当前负载相对测试时的倍数
+        ordered = sorted(self.latencies)
+        index = ordered.index(self.complexity)
+        higher = ordered[index + 1] if index + 1 < len(ordered) else None
+
+        if latency > interval and index > 0:
+            self.headroom_since = 0
+            self.overload_since = self.overload_since or now
+            if now - self.overload_since >= cfg['sustain_seconds']:
+                self.overload_since = 0
+                return self.choose(load)
+        elif higher is not None and self.latencies[higher] * load <= interval * cfg['upgrade_headroom']:
+            self.overload_since = 0
+            self.headroom_since = self.headroom_since or now
+            if now - self.headroom_since >= cfg['sustain_seconds']:
+                self.headroom_since = 0
+                return higher
+        else:
+            self.overload_since = 0
+            self.headroom_since = 0
+        return None
+
+    def request(self, complexity):
+        """在后台线程加载新模型，加载期间继续使用当前模型"""
+        if complexity == self.complexity or self.loading:
+            return
+        self.loading = True
+        threading.Thread(target=self._load, args=(complexity,), name="model-loader", daemon=True).start()
+
+    def _load(self, complexity):
+        """后台线程：加载模型，完成后等待推理线程替换"""
+        try:
+            pose = create_pose(complexity)
+            with self.lock:
+                self.pending = (complexity, pose)
+        except Exception as e:
+            logging.error(f"加载复杂度{complexity}的模型失败: {str(e)}")
+        finally:
+            self.loading = False
+
+    def take_pending(self):
+        """取出已加载完成的模型(推理线程调用)，没有时返回None"""
+        with self.lock:
+            pending, self.pending = self.pending, None
+        if pending is None:
+            return None
+        self.complexity = pending[0]
+        return pending[1]
+
+# ================== 核心功能类 ==================
+class COSUploader:
+    def __init__(self):
+        self.cos_client = CosS3Client(CosConfig(
+            Region=GLOBAL_CONFIG['cos']['Region'],
+            SecretId=GLOBAL_CONFIG['cos']['SecretId'],
+            SecretKey=GLOBAL_CONFIG['cos']['SecretKey'],
+            Scheme=GLOBAL_CONFIG['cos']['Scheme'],
+            Domain=GLOBAL_CONFIG['cos']['Domain'] or None
+        ))
+
+    def upload_file(self, file_path):
+        """上传本地文件(离线缓存补传时使用)"""
+        if not os.path.isfile(file_path):
+            raise FileNotFoundError(f"文件不存在：{file_path}")
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        return self.upload_bytes(data)
+
+    def upload_bytes(self, data, md5=None, suffix=''):
+        """用put_object直接上传内存中的JPEG，md5为预先计算的摘要(bytes)，服务端据此校验内容"""
+        if md5 is None:
+            md5 = hashlib.md5(data).digest()
+        object_key = f"posture_captures/{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}{suffix}.jpg"
+        try:
+            logging.info(f"上传文件：{object_key}")
+            self.cos_client.put_object(
+                Bucket=GLOBAL_CONFIG['cos']['Bucket'],
+                Body=data,
+                Key=object_key,
+                ContentType='image/jpeg',
+                ContentMD5=base64.b64encode(md5).decode('ascii')
+            )
+            cos = GLOBAL_CONFIG['cos']
+            host = cos['Domain'] or f"{cos['Bucket']}.cos.{cos['Region']}.myqcloud.com"
+            display_url = f"{cos['Scheme']}://{host}/{object_key}"
+            logging.info(f"上传成功，URL：{display_url}")
+            return display_url
+        except Exception as e:
+            logging.error(f"COS上传失败：{str(e)}")
+            raise
+
+class JpegEncoder:
+    """截图JPEG编码，结果留在内存中，不经过磁盘
+
+    默认使用cv2.imencode；配置为'turbojpeg'且已安装PyTurboJPEG时直接调用libjpeg-turbo，
+    无法加载时回退到OpenCV。也可以替换为任何提供 encode(image, quality) -> bytes 的对象。
+    """
+    def __init__(self, backend='opencv', quality=95):
+        self.quality = quality
+        self.turbo = None
+        if backend == 'turbojpeg':
+            if TurboJPEG is None:
+                logging.warning("未安装PyTurboJPEG，使用OpenCV编码截图")
+            else:
+                try:
+                    self.turbo = TurboJPEG()
+                except Exception as e:
+                    logging.warning(f"无法加载libjpeg-turbo，使用OpenCV编码截图: {str(e)}")
+        self.backend = 'turbojpeg' if self.turbo is not None else 'opencv'
+
+    def encode(self, image, quality=None):
+        quality = quality or self.quality
+        if self.turbo is not None:
+            return self.turbo.encode(image, quality=quality)
+        success, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not success:
+            raise IOError("JPEG编码失败")
+        return buffer.tobytes()
+
+class UploadProfileSelector:
+    """根据实测上传速度选择截图编码档位
+
+    每次上传原图后用 字节数/耗时 更新滑动平均速度，从高到低选择第一个 min_throughput 不超过该速度的档位。
+    缩略图太小，耗时主要是连接延迟，不参与测速。
+    """
+    def __init__(self):
+        cfg = GLOBAL_CONFIG['upload']
+        self.profiles = cfg['profiles']
+        self.mode = cfg['profile']
+        self.default = cfg['default_profile']
+        self.smoothing = cfg['throughput_smoothing']
+        self.throughput = None                # 平均上传速度(字节/秒)，尚未测量时为None
+        self.lock = threading.Lock()
+
+    def observe(self, size, seconds):
+        if seconds <= 0:
+            return
+        rate = size / seconds
+        with self.lock:
+            if self.throughput is None:
+                self.throughput = rate
+            else:
+                self.throughput += self.smoothing * (rate - self.throughput)
+
+    def current(self):
+        """返回 (档位名称, 档位配置)"""
+        if self.mode != 'auto':
+            return self.mode, self.profiles[self.mode]
+        if self.throughput is None:
+            return self.default, self.profiles[self.default]
+        kb_per_second = self.throughput / 1024
+        ranked = sorted(self.profiles.items(), key=lambda item: item[1]['min_throughput'], reverse=True)
+        for name, profile in ranked:
+            if kb_per_second >= profile['min_throughput']:
+                return name, profile
+        return ranked[-1]
+
+    def metrics(self):
+        return {
+            'profile': self.current()[0],
+            'throughput_kbps': round(self.throughput / 1024, 1) if self.throughput is not None else None
+        }
+
+# ================== 坐姿监测引擎 ==================
+class PostureEngine(QObject):
+    """无界面坐姿监测引擎
+
+    所有状态变化都通过信号发布。只有注册了渲染函数(set_renderer)时才执行渲染阶段，
+    无显示器运行时不做任何绘制和图像格式转换，检测可以跑满帧率。
+    offline=True 时只保留检测流水线，不创建上传、离线缓存、令牌和云指令轮询，
+    不访问网络和共享的状态文件(离线回放测试使用)。
+    """
+    status_update = Signal(str, str)
+    posture_update = Signal(str, bool)           # 只在某个姿势的状态变化时发出
+    upload_complete = Signal(str)
+    command_executed = Signal(str, str)
+    camera_state_changed = Signal(bool)           # 摄像头已启动/已停止
+
+    def __init__(self, parent=None, offline=False):
+        super().__init__(parent)
+        
+        # 状态跟踪变量
+        self.warning_start_time = 0
+        self.last_upload_time = 0
+        self.warning_duration = 0
+        self.current_warnings = 0
+        self.posture_warnings = []
+        self.current_fps = 0.0                 # 最近一帧的帧率(由界面定时读取)
+        self.inference_rate = 0.0              # 实际推理频率
+        self.voice_enabled = True              # 语音提醒开关(供推理线程读取)
+        self.offline = offline
+        self.capture_enabled = not offline     # 自动截图上传开关(离线回放时关闭)
+        
+        # 初始化组件
+        self.encoder = JpegEncoder(GLOBAL_CONFIG['upload']['encoder'])
+        self.profile_selector = UploadProfileSelector()
+        self.token_manager = None
+        self.uploader = None
+        self.record_batcher = None
+        self.upload_pool = None
+        if not offline:
+            self.token_manager = cloud_token_service()
+            self.uploader = COSUploader()
+            records_cfg = GLOBAL_CONFIG['records']
+            self.record_batcher = RecordBatcher(self.add_records, records_cfg['batch_size'],
+                                                records_cfg['batch_window'], self.records_written,
+                                                self.records_failed)
+            upload_cfg = GLOBAL_CONFIG['upload']
+            self.upload_pool = UploadPool(upload_cfg['workers'], upload_cfg['queue_size'],
+                                          upload_cfg['max_retries'], upload_cfg['backoff_base'],
+                                          upload_cfg['backoff_max'])
+        self.voice_alerts = VoiceAlerts()
+        self.global_state = GlobalState(cloud=not offline)
+        
+        # 姿势状态跟踪
+        self.posture_states = {
+            "HUNCHBACK": {"active": False, "start_time": 0},
+            "SLOUCHING": {"active": False, "start_time": 0},
+            "UNEVEN SHOULDERS": {"active": False, "start_time": 0},
+            "TOO CLOSE": {"active": False, "start_time": 0},
+            "CROSSED LEGS": {"active": False, "start_time": 0}
+        }
+        
+        # 截图在内存中编码上传，临时目录只用于接收旧版本遗留的截图
+        self.temp_dir = "posture_captures"
+        
+        # 离线上传缓存
+        spool_cfg = GLOBAL_CONFIG['spool']
+        self.spool = None
+        if spool_cfg['enabled'] and not offline:
+            self.spool = UploadSpool(spool_cfg['dir'], spool_cfg['max_bytes'], self.upload_spooled,
+                                     self.capture_uploaded, spool_cfg['retry_base'], spool_cfg['retry_max'],
+                                     spool_cfg['max_attempts'], cloud_http.NETWORK_ERRORS)
+            self.adopt_leftover_captures()
+        
+        # 初始化MediaPipe(复杂度由测试结果自动选择)
+        self.mp_pose = mp.solutions.pose
+        self.model_selector = ModelSelector()
+        self.pose = create_pose(self.model_selector.complexity)
+        logging.info(f"使用模型复杂度: {self.model_selector.complexity}")
+        self.metrics_engine = PoseMetricsEngine()
+        self.roi_tracker = RoiTracker()
+        self.stage_timers = StageTimers(GLOBAL_CONFIG['diagnostics']['window'],
+                                        GLOBAL_CONFIG['diagnostics']['enabled'])
+        self.last_diagnostics_time = time.time()
+        self.overlay = OverlayRenderer(
+            GLOBAL_CONFIG['overlay']['font_path'],
+            GLOBAL_CONFIG['overlay']['sprite_cache_size']
+        )
+        
+        # 初始化摄像头
+        self.cap = None
+        self.cam_width = 640
+        self.cam_height = 480
+        self.camera_lock = threading.RLock()   # 界面和云指令都可能启停摄像头
+        
+        # 帧处理流水线(启动摄像头时创建)
+        self.pipeline = None
+        self.renderer = None                   # 渲染函数(由界面注册)，None表示无界面运行
+        self.prev_time = time.time()
+        self.governor = InferenceGovernor()
+        self.last_result = {'pose_landmarks': None, 'posture_warnings': []}  # 跳帧时沿用的检测结果
+        self.last_pose = None                  # 最近检测到的 (关键点, 指标, 画面尺寸)，骨架模式使用
+        self.closed = False
+
+        # 连接全局状态信号
+        self.global_state.status_update.connect(self.status_update)
+        self.global_state.command_executed.connect(self.command_executed)
+        # 引擎对象属于创建它的线程，云指令经排队信号回到该线程执行
+        self.global_state.camera_control_needed.connect(self.handle_cloud_camera_control)
+        # 启动云指令轮询
+        self.global_state.start_cloud_poller()
+
+    @property
+    def camera_active(self):
+        return self.global_state.camera_active
+
+    def set_renderer(self, renderer):
+        """注册渲染函数 frame_result -> None (在渲染线程调用)，传入None关闭渲染阶段"""
+        self.renderer = renderer
+
+    def handle_cloud_camera_control(self, start):
+        """处理云端的摄像头控制指令"""
+        if start:
+            if not self.camera_active and self.start_camera():
+                self.status_update.emit("摄像头已启动(云指令)", "#4CAF50")
+        elif self.camera_active:
+            self.stop_camera()
+            self.status_update.emit("摄像头已停止(云指令)", "#FF9800")
+
+    def start_camera(self, source=None):
+        """启动帧来源和处理流水线
+
+        source 可以是摄像头索引、None(自动检测摄像头)或任意 FrameSource(视频、图片目录等)。
+        """
+        with self.camera_lock:
+            try:
+                if self.pipeline is not None:
+                    self.pipeline.stop()
+                    self.pipeline = None
+                if self.cap is not None:
+                    self.cap.release()
+                    self.cap = None
+                
+                if not isinstance(source, FrameSource):
+                    resolution = GLOBAL_CONFIG['resolution']
+                    source = CameraSource(
+                        source,
+                        width=resolution['capture_width'],
+                        height=resolution['capture_height'],
+                        buffer_size=GLOBAL_CONFIG['pipeline']['camera_buffer_size']
+                    )
+                    if not source.open():
+                        return False
+                self.cap = source
+                self.cam_width, self.cam_height = source.width, source.height
+                
+                # 启动帧处理流水线
+                self.reset_session()
+                self.pipeline = FramePipeline(
+                    read_frame=source.read,
+                    infer=self.process_frame,
+                    render=self.render_frame,
+                    on_error=self.handle_read_error,
+                    is_finished=lambda: source.finished,
+                    on_end=self.handle_source_end,
+                    timers=self.stage_timers
+                )
+                self.pipeline.start()
+                
+                # 更新全局状态
+                self.global_state.camera_active = True
+            except Exception as e:
+                logging.error(f"启动摄像头时出错: {str(e)}")
+                return False
+        self.camera_state_changed.emit(True)
+        return True
+
+    def stop_camera(self):
+        with self.camera_lock:
+            if self.pipeline is not None:
+                self.pipeline.stop()
+                self.pipeline = None
+            if self.cap is not None:
+                self.cap.release()
+                self.cap = None
+            # 清除各姿势的警告状态，界面随之恢复正常显示
+            self.reset_session()
+            
+            # 更新全局状态
+            self.global_state.camera_active = False
+        
+        self.camera_state_changed.emit(False)
+        self.status_update.emit("摄像头已停止", "#f44336")
+        
+    def save_to_cloudbase(self, display_url, upload_time=None, thumb_url=None):
+        """将URL立即存入微信云开发数据库，upload_time为截图时间(默认当前时间)"""
+        return self.add_record(self.photo_record(display_url, upload_time, thumb_url))
+
+    @staticmethod
+    def photo_record(display_url, upload_time=None, thumb_url=None):
+        """截图记录，有缩略图时同时写入thumb_url，小程序可以先加载缩略图"""
+        record = {'display_url': display_url}
+        if thumb_url:
+            record['thumb_url'] = thumb_url
+        record['upload_time'] = upload_time or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return record
+
+    def add_record(self, record):
+        """立即向云开发数据库添加一条记录，返回是否成功"""
+        try:
+            self.add_records([record])
+            return True
+        except Exception as e:
+            logging.error(f"保存到云开发失败: {str(e)}")
+            return False
+
+    def add_records(self, records):
+        """一次 databaseadd 请求添加多条记录(data为数组)，失败时抛出异常
+
+        JSON即合法的JS对象字面量，直接拼入查询语句。
+        """
+        access_token = self.token_manager.get_token()
+        payload = {
+            "env": GLOBAL_CONFIG['wx_cloud']['env_id'],
+            "query": f"db.collection('{GLOBAL_CONFIG['wx_cloud']['collection_name']}').add({{data: {json.dumps(records, ensure_ascii=False)}}})"
+        }
+        
+        # 使用正确的add_api_url
+        response = cloud_http.post(
+            f"{GLOBAL_CONFIG['wx_cloud']['add_api_url']}?access_token={access_token}",
+            json=payload,
+            headers={'Content-Type': 'application/json'},
+            timeout=GLOBAL_CONFIG['records']['timeout']
+        )
+        response.raise_for_status()
+        result = response.json()
+        
+        if result.get('errcode') in TOKEN_ERRORS:
+            self.token_manager.invalidate(access_token)
+        if result.get('errcode') != 0:
+            raise Exception(f"云开发错误: {result.get('errmsg')} (Code: {result.get('errcode')})")
+        logging.info(f"数据存入成功，{len(records)}条记录，ID: {', '.join(result.get('id_list') or ['未知ID'])}")
+
+    def queue_record(self, record):
+        """记录交给批量写入线程；已停止时直接转存离线缓存"""
+        if not self.record_batcher.add(record):
+            self.spool_record(record)
+
+    def records_written(self, records):
+        """批量写入成功：通知界面截图已发送到小程序"""
+        for record in records:
+            if record.get('display_url'):
+                self.upload_complete.emit(record['display_url'])
+            else:
+                self.status_update.emit("骨架记录已发送到小程序", "#4CAF50")
+
+    def records_failed(self, records, error):
+        """批量写入失败：每条记录按顺序转存离线缓存，网络恢复后补写"""
+        for record in records:
+            self.spool_record(record)
+
+    def submit_capture(self, image, priority=PRIORITY_NORMAL):
+        """把截图放入上传队列，返回是否已入队
+
+        截图时的姿势警告和时间随任务一起保存，水印和数据库记录不受排队时间的影响。
+        队列已满被丢弃、多次重试仍失败或退出时尚未上传的截图都转存到离线缓存。
+        """
+        if self.offline:
+            return False
+        if GLOBAL_CONFIG['upload']['artifact'] == 'skeleton':
+            return self.submit_skeleton(priority)
+        image = image.copy()                  # 使用副本，避免采集线程复用缓冲区
+        warnings = list(self.posture_warnings)
+        progress = {'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        job = UploadJob(
+            lambda: self.handle_capture(image, warnings, progress),
+            name=f"截图 {progress['time']}",
+            priority=priority,
+            on_success=self.capture_uploaded,
+            on_failure=lambda e: self.spool_capture(image, warnings, progress),
+            on_drop=lambda: self.spool_capture(image, warnings, progress)
+        )
+        if not self.upload_pool.submit(job):
+            self.status_update.emit("上传队列已满，截图已转存", "#FF9800")
+            return False
+        return True
+
+    def submit_skeleton(self, priority=PRIORITY_NORMAL):
+        """骨架模式：用最近一次检测到的关键点、警告和指标生成记录并放入上传队列"""
+        pose = self.last_pose
+        if pose is None:
+            self.status_update.emit("未检测到人体，无法生成骨架记录", "#FF9800")
+            return False
+        landmarks, metrics, frame_size = pose
+        captured_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        record = build_skeleton_record(landmarks, self.posture_warnings, metrics, frame_size, captured_at)
+        # 离线缓存中还有未补传的内容时排在其后：转存(写文件+fsync)交给上传线程，不占用推理线程；
+        # 上传队列已满被丢弃时改为交给批量写入线程
+        if self.spool is not None and self.spool.pending():
+            self.upload_pool.submit(UploadJob(
+                lambda: self.spool_record(record),
+                name=f"骨架记录 {captured_at}",
+                priority=priority,
+                on_drop=lambda: self.queue_record(record)
+            ))
+        else:
+            # 骨架记录不需要上传COS，直接交给批量写入线程(写入失败时由该线程转存)
+            self.queue_record(record)
+        return True
+
+    def spool_record(self, record):
+        """写入失败的数据库记录转存到离线缓存"""
+        data = json.dumps(record, ensure_ascii=False).encode('utf-8')
+        if self.spool is not None and self.spool.add_bytes(data, record['upload_time'], {'kind': 'record'}, '.json'):
+            return
+        self.status_update.emit("记录上传失败", "#f44336")
+
+    def prepare_capture(self, image, warnings, progress):
+        """按当前编码档位添加中文水印、缩放并在内存中编码(只执行一次)
+
+        结果保存在progress中：JPEG数据、MD5摘要，以及档位要求时的缩略图。
+        """
+        if 'data' in progress:
+            return
+        start = time.perf_counter()
+        profile_name, profile = self.profile_selector.current()
+        
+        # 先缩小再加水印，水印字号相对画面保持不变
+        if profile['max_dim']:
+            image = fit_to_size(image, profile['max_dim'], profile['max_dim'])
+        
+        # 添加中文水印（如果有错误姿势）
+        if warnings:
+            # 准备水印文本（转换为中文）
+            chinese_warnings = [POSTURE_CHINESE_MAP[warn] for warn in warnings]
+            watermark_text = " | ".join(chinese_warnings)
+            
+            # 红色半透明背景+白色文字，四周留5像素
+            sprite = self.overlay.sprite(watermark_text, 30, (255, 255, 255),
+                                         background=(255, 0, 0, 128), padding=5)
+            
+            # 计算水印位置（右上角）
+            margin = 20
+            position = (image.shape[1] - sprite.width - margin + 5, margin - 5)
+            image = self.overlay.compose(image, [(sprite, position)])
+        
+        # 编码并计算MD5，上传时由COS校验
+        progress['data'] = self.encoder.encode(image, profile['quality'])
+        progress['md5'] = hashlib.md5(progress['data']).digest()
+        progress['thumbnail'] = profile['thumbnail']
+        if profile['thumbnail']:
+            progress['thumb'] = self.encode_thumbnail(image, profile['thumbnail'])
+        self.stage_timers.record('encode', time.perf_counter() - start)
+        logging.info(f"截图编码完成: 档位{profile_name}，{len(progress['data']) // 1024}KB")
+
+    def encode_thumbnail(self, image, size):
+        return self.encoder.encode(fit_to_size(image, size, size), GLOBAL_CONFIG['upload']['thumbnail_quality'])
+
+    def upload_capture_data(self, data, md5=None, thumb=None):
+        """上传原图(并记录上传速度)和缩略图，返回 (原图地址, 缩略图地址或None)"""
+        start = time.perf_counter()
+        display_url = self.uploader.upload_bytes(data, md5)
+        self.profile_selector.observe(len(data), time.perf_counter() - start)
+        thumb_url = self.uploader.upload_bytes(thumb, suffix='_thumb') if thumb else None
+        return display_url, thumb_url
+
+    def handle_capture(self, image, warnings, progress):
+        """上传线程：编码并上传截图，数据库记录交给批量写入线程
+
+        上传失败时抛出异常由上传池按退避间隔重试；progress记录已完成的步骤，
+        重试时跳过已编码的数据和已上传的对象，不会重复上传。
+        """
+        if 'data' not in progress:
+            self.status_update.emit("正在处理截图...", "#2196F3")
+        self.prepare_capture(image, warnings, progress)
+        
+        # 离线缓存中还有未补传的截图时直接排在其后，保证按时间顺序上传；
+        # 缓存拒绝(已停止或超过容量上限)时不丢弃截图，改为直接上传
+        if 'display_url' not in progress and self.spool is not None and self.spool.pending():
+            if self.spool.add_bytes(progress['data'], progress['time'], {'thumbnail': progress['thumbnail']}):
+                return None
+            logging.warning(f"截图无法存入离线缓存，改为直接上传: {progress['time']}")
+        
+        # 上传到COS
+        if 'display_url' not in progress:
+            progress['display_url'], progress['thumb_url'] = self.upload_capture_data(
+                progress['data'], progress['md5'], progress.get('thumb'))
+        
+        # 保存到云开发(合并写入，成功后通知界面)
+        self.queue_record(self.photo_record(progress['display_url'], progress['time'], progress['thumb_url']))
+
+    def capture_uploaded(self, display_url):
+        if display_url:
+            self.upload_complete.emit(display_url)
+
+    def spool_capture(self, image, warnings, progress):
+        """上传失败或被丢弃的截图写入离线缓存(只有这种情况才写磁盘)
+
+        缩略图不写入缓存，补传时从原图重新生成。
+        """
+        try:
+            self.prepare_capture(image, warnings, progress)
+            fields = {'thumbnail': progress['thumbnail']}
+            if 'display_url' in progress:
+                fields.update(url=progress['display_url'], thumb_url=progress['thumb_url'])
+            if self.spool is not None and self.spool.add_bytes(progress['data'], progress['time'], fields):
+                self.status_update.emit("网络不可用，截图已存入离线缓存", "#FF9800")
+                return
+        except Exception as e:
+            logging.error(f"截图转存失败: {str(e)}")
+        self.status_update.emit("截图上传失败", "#f44336")
+
+    def upload_spooled(self, entry, path):
+        """补传线程：上传离线缓存中的一张截图(已上传到COS的只补写数据库)或一条数据库记录"""
+        if entry.get('kind') == 'record':
+            with open(path, encoding='utf-8') as f:
+                record = json.load(f)
+            self.add_records([record])
+            logging.info(f"离线记录已补传: {entry['time']}")
+            return record.get('display_url')
+        display_url = entry.get('url')
+        thumb_url = entry.get('thumb_url')
+        if not display_url:
+            with open(path, 'rb') as f:
+                data = f.read()
+            thumb = None
+            if entry.get('thumbnail'):
+                image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+                thumb = self.encode_thumbnail(image, entry['thumbnail'])
+            display_url, thumb_url = self.upload_capture_data(data, thumb=thumb)
+            self.spool.mark_uploaded(entry['id'], url=display_url, thumb_url=thumb_url)
+        if not self.save_to_cloudbase(display_url, entry['time'], thumb_url):
+            raise RuntimeError("保存到云开发失败")
+        logging.info(f"离线截图已补传: {entry['time']}")
+        return display_url
+
+    def adopt_leftover_captures(self):
+        """旧版本写入临时目录后未能上传的截图移入离线缓存"""
+        if not os.path.isdir(self.temp_dir):
+            return
+        for name in sorted(os.listdir(self.temp_dir)):
+            path = os.path.join(self.temp_dir, name)
+            if name.startswith('capture_') and os.path.isfile(path):
+                created = datetime.fromtimestamp(os.path.getmtime(path)).strftime('%Y-%m-%d %H:%M:%S')
+                try:
+                    self.spool.add_file(path, created)
+                except OSError as e:
+                    logging.warning(f"无法转存遗留截图 {name}: {str(e)}")
+
+    def reset_session(self):
+        """开始处理新的帧来源前重置计时、调速和跟踪状态"""
+        self.prev_time = time.time()
+        self.governor = InferenceGovernor()
+        self.last_result = {'pose_landmarks': None, 'posture_warnings': []}
+        self.last_pose = None
+        self.roi_tracker.reset()
+        self.current_fps = self.inference_rate = 0.0
+        self.current_warnings = 0
+        self.posture_warnings = []
+        self.warning_start_time = 0
+        self.warning_duration = 0
+        for posture, state in self.posture_states.items():
+            if state["active"]:
+                state["active"] = False
+                self.posture_update.emit(posture, False)
+
+    def handle_source_end(self):
+        """采集线程：回放来源已全部读完"""
+        cap = self.cap                        # 摄像头可能已被停止(self.cap 置为None)
+        logging.info(f"帧来源已结束: {cap.describe() if cap is not None else '已停止'}")
+        self.status_update.emit("帧来源已播放完毕", "#FF9800")
+
+    def handle_read_error(self):
+        """采集线程读帧失败"""
+        logging.warning("无法接收帧，尝试重新连接...")
+        self.status_update.emit("无法接收帧", "#f44336")
+
+    def process_frame(self, image):
+        """推理阶段(推理线程)：姿势检测与姿势状态分析，不访问任何界面控件"""
+        # 检查全局截图请求
+        if self.global_state.capture_requested:
+            with self.global_state.lock:
+                self.global_state.capture_requested = False
+            self.submit_capture(image, PRIORITY_HIGH)
+        
+        # 计算FPS
+        current_time = time.time()
+        fps = 1 / (current_time - self.prev_time) if self.prev_time > 0 else 0
+        self.prev_time = current_time
+        self.current_fps = fps
+        self.inference_rate = self.governor.frame_rate / self.governor.skip
+        
+        # 推理调速：跳过的帧沿用上一次的关键点进行显示，不推进姿势状态机
+        if not self.governor.should_infer(current_time):
+            return dict(self.last_result, image=image, fps=fps)
+        
+        # 模型选择：首次启动时测试各复杂度，之后在后台加载好的新模型直接替换
+        if self.model_selector.needs_benchmark and self.model_selector.collect(image):
+            self.status_update.emit("正在后台测试模型性能...", "#2196F3")
+            self.model_selector.start_benchmark()
+        self.swap_model()
+        
+        # 姿势检测：已跟踪到人体时只对ROI推理，跟踪丢失时回退到全帧
+        infer_start = time.perf_counter()
+        roi = self.roi_tracker.current(image.shape[1], image.shape[0])
+        results = self.detect_pose(image, roi)
+        if roi is not None and not results.pose_landmarks:
+            self.roi_tracker.reset()
+            results = self.detect_pose(image, None)
+        self.governor.record_inference(time.perf_counter() - infer_start)
+        if self.governor.adjust(current_time):
+            self.report_governor()
+            complexity = self.model_selector.observe(self.governor.latency, current_time)
+            if complexity is not None:
+                logging.info(f"推理负载变化，切换模型复杂度: {self.model_selector.complexity} -> {complexity}")
+                self.model_selector.request(complexity)
+        
+        frame_result = {
+            'image': image,
+            'fps': fps,
+            'pose_landmarks': results.pose_landmarks
+        }
+        posture_warnings = []
+        if results.pose_landmarks:
+            # 33个关键点一次性写入(33,4)数组，向量化计算全部指标
+            metrics_start = time.perf_counter()
+            landmarks = self.metrics_engine.load(results.pose_landmarks.landmark)
+            metrics = self.metrics_engine.compute(landmarks)
+            self.roi_tracker.update(landmarks, image.shape[1], image.shape[0])
+            posture_warnings = detect_warnings(metrics, GLOBAL_CONFIG['posture'])
+            self.last_pose = (landmarks.copy(), metrics, (image.shape[1], image.shape[0]))
+            self.stage_timers.record('metrics', time.perf_counter() - metrics_start)
+            avg_hip_angle = metrics['avg_hip_angle']
+            spine_angle = metrics['spine_angle']
+
+            self.posture_warnings = posture_warnings
+            self.update_posture_states(image, current_time)
+            frame_result['metrics'] = metrics
+            frame_result['avg_hip_angle'] = avg_hip_angle
+            frame_result['spine_angle'] = spine_angle
+        else:
+            self.posture_warnings = posture_warnings
+            self.last_pose = None
+
+        frame_result['posture_warnings'] = posture_warnings
+        self.last_result = {k: v for k, v in frame_result.items() if k not in ('image', 'fps')}
+        self.report_diagnostics(current_time)
+        return frame_result
+
+    def report_governor(self):
+        """通过状态信号报告调速器的最新决策"""
+        g = self.governor
+        logging.info(f"推理调速: {g.rate:.1f}Hz, 每{g.skip}帧推理一次, "
+                     f"推理耗时{g.latency*1000:.0f}ms, CPU占用{g.cpu_load*100:.0f}%")
+        self.status_update.emit(f"推理调速: {g.rate:.1f}Hz (1/{g.skip}帧), CPU {g.cpu_load*100:.0f}%", "#2196F3")
+
+    def diagnostics_report(self):
+        """各阶段耗时统计及当前推理设置"""
+        stages = self.stage_timers.snapshot()
+        bound = bottleneck(stages)
+        return {
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'model_complexity': self.model_selector.complexity,
+            'inference_rate': round(self.governor.rate, 2),
+            'frame_skip': self.governor.skip,
+            'bottleneck': bound[0] if bound else None,
+            'stages': stages,
+            'uploads': None if self.offline else dict(self.upload_pool.metrics(), **self.profile_selector.metrics()),
+            'records': None if self.offline else self.record_batcher.metrics(),
+            'spool': self.spool.metrics() if self.spool is not None else None
+        }
+
+    def report_diagnostics(self, now):
+        """定期把各阶段耗时输出为一行JSON日志，并按配置写入JSON文件"""
+        cfg = GLOBAL_CONFIG['diagnostics']
+        if not cfg['enabled'] or not cfg['log_interval'] or now - self.last_diagnostics_time < cfg['log_interval']:
+            return
+        self.last_diagnostics_time = now
+        report = self.diagnostics_report()
+        logging.info(f"性能统计: {json.dumps(report, ensure_ascii=False)}")
+        if cfg['dump_file']:
+            try:
+                # 先写临时文件再替换，避免读取方看到写了一半的文件
+                temp_path = cfg['dump_file'] + '.tmp'
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(report, f, indent=2, ensure_ascii=False)
+                os.replace(temp_path, cfg['dump_file'])
+            except OSError as e:
+                logging.warning(f"写入性能统计文件失败: {str(e)}")
+
+    def swap_model(self):
+        """推理线程：替换为后台加载完成的新模型"""
+        pose = self.model_selector.take_pending()
+        if pose is None:
+            return
+        old_pose, self.pose = self.pose, pose
+        old_pose.close()
+        # 新模型没有跟踪状态，从全帧重新检测，耗时也需要重新统计
+        self.roi_tracker.reset()
+        self.governor.latency = 0.0
+        self.status_update.emit(f"已切换到模型复杂度 {self.model_selector.complexity}", "#2196F3")
+
+    def detect_pose(self, image, roi=None):
+        """对整帧或ROI区域运行姿势模型，关键点统一映射回全帧归一化坐标
+
+        区域先等比缩小到推理分辨率再做颜色转换，显示和截图仍使用原始分辨率。
+        """
+        resolution = GLOBAL_CONFIG['resolution']
+        timers = self.stage_timers
+        start = time.perf_counter()
+        region = image if roi is None else image[roi[1]:roi[3], roi[0]:roi[2]]
+        region = fit_to_size(region, resolution['inference_width'], resolution['inference_height'])
+        resized = time.perf_counter()
+        region = cv2.cvtColor(region, cv2.COLOR_BGR2RGB)
+        converted = time.perf_counter()
+        results = self.pose.process(region)
+        timers.record('resize', resized - start)
+        timers.record('cvt_color', converted - resized)
+        timers.record('pose', time.perf_counter() - converted)
+        if roi is not None and results.pose_landmarks:
+            x0, y0, x1, y1 = roi
+            h, w = image.shape[:2]
+            sx, sy = (x1 - x0) / w, (y1 - y0) / h
+            ox, oy = x0 / w, y0 / h
+            for lm in results.pose_landmarks.landmark:
+                lm.x = lm.x * sx + ox
+                lm.y = lm.y * sy + oy
+                lm.z = lm.z * sx                  # z与x使用相同的尺度
+        return results
+
+    def update_posture_states(self, image, current_time):
+        """姿势状态机：更新各姿势计时、语音提醒和自动截图"""
+        # 更新警告状态
+        self.current_warnings = len(self.posture_warnings)
+        
+        # 更新姿势状态并触发语音提醒
+        current_detected = set(self.posture_warnings)
+        
+        # 遍历所有姿势状态
+        for posture, state in self.posture_states.items():
+            warning = posture in current_detected
+            
+            if warning:
+                # 如果之前未激活，则激活并记录开始时间
+                if not state["active"]:
+                    state["active"] = True
+                    state["start_time"] = current_time
+                    self.posture_update.emit(posture, True)
+                else:
+                    # 如果已经激活，检查持续时间是否达到语音提醒的最小持续时间
+                    if self.voice_enabled and current_time - state["start_time"] >= GLOBAL_CONFIG['voice']['min_warning_duration']:
+                        # 触发语音提醒
+                        self.voice_alerts.add_alert(posture)
+            elif state["active"]:
+                # 当前未检测到该姿势，重置状态
+                state["active"] = False
+                self.posture_update.emit(posture, False)
+        
+        # 有足够多的警告时开始计时
+        if self.current_warnings >= GLOBAL_CONFIG['posture']['min_warnings']:
+            if self.warning_start_time == 0:  # 第一次检测到警告
+                self.warning_start_time = time.time()
+                logging.info(f"检测到{self.current_warnings}个异常姿势，开始计时...")
+                self.status_update.emit(f"检测到{self.current_warnings}个异常姿势", "#FF9800")
+            
+            # 计算持续时间
+            self.warning_duration = time.time() - self.warning_start_time
+            
+            # 满足持续时间且冷却期已过
+            if (self.warning_duration >= GLOBAL_CONFIG['posture']['min_duration'] and 
+                (time.time() - self.last_upload_time) >= GLOBAL_CONFIG['posture']['cooldown']):
+                self.last_upload_time = time.time()
+                self.warning_start_time = 0  # 重置计时器
+                
+                # 放入上传队列，由上传线程处理截图和上传
+                if self.capture_enabled:
+                    self.submit_capture(image)
+        else:
+            # 警告数量不足，重置计时器
+            self.warning_start_time = 0
+            self.warning_duration = 0
+
+    def stats_snapshot(self):
+        """界面定时读取的统计值：(帧率, 推理频率, 警告数, 持续时间, 冷却剩余, 进度)
+
+        持续时间和冷却时间按当前时刻计算，不依赖推理线程逐帧推送。
+        """
+        cfg = GLOBAL_CONFIG['posture']
+        now = time.time()
+        duration = cooldown = 0.0
+        progress = 0
+        if self.current_warnings >= cfg['min_warnings'] and self.warning_start_time:
+            duration = now - self.warning_start_time
+            progress = min(100, int(duration / cfg['min_duration'] * 100))
+            cooldown = max(0, cfg['cooldown'] - (now - self.last_upload_time))
+        return self.current_fps, self.inference_rate, self.current_warnings, duration, cooldown, progress
+
+    def render_frame(self, frame_result):
+        """渲染阶段(渲染线程)：交给已注册的渲染函数，无界面运行时直接丢弃"""
+        renderer = self.renderer
+        if renderer is not None:
+            renderer(frame_result)
+
+    def manual_capture(self):
+        if self.pipeline is not None and self.cap is not None:
+            # 摄像头由采集线程独占，这里直接使用最近采集到的帧
+            image = self.pipeline.latest_frame
+            if image is not None:
+                if self.submit_capture(image, PRIORITY_HIGH):
+                    self.status_update.emit("正在上传截图...", "#2196F3")
+            else:
+                self.status_update.emit("无法获取当前帧", "#f44336")
+        else:
+            self.status_update.emit("摄像头未启动", "#f44336")
+
+    def set_cloud_enabled(self, enabled):
+        GLOBAL_CONFIG['cloud_enabled'] = enabled
+        if enabled:
+            self.global_state.start_cloud_poller()
+            self.status_update.emit("云服务已启用", "#4CAF50")
+        else:
+            self.global_state.stop_cloud_poller()
+            self.status_update.emit("云服务已禁用", "#FF9800")
+
+    def shutdown(self):
+        """停止摄像头、语音提醒和云指令轮询(可重复调用)"""
+        if self.closed:
+            return
+        self.closed = True
+        self.stop_camera()
+        self.voice_alerts.stop()
+        self.global_state.stop_cloud_poller()
+        if self.offline:
+            return
+        pending = self.upload_pool.stop()
+        if pending:
+            logging.info(f"退出时还有{len(pending)}个截图未上传，已转存到离线缓存")
+        self.record_batcher.stop()
+        if self.spool is not None:
+            self.spool.stop()
+        self.token_manager.stop()
+        cloud_http.close()
+
+# ================== 守护进程入口 ==================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="智能坐姿监测系统(无界面模式)")
+    parser.add_argument('--camera', type=int, default=None, help="摄像头索引(默认自动检测)")
+    parser.add_argument('--source', default=None,
+                        help="用视频文件、图片目录或 synthetic 代替摄像头，按原始帧率播放")
+    parser.add_argument('--no-voice', action='store_true', help="关闭语音提醒")
+    parser.add_argument('--no-cloud', action='store_true', help="关闭云指令轮询")
+    parser.add_argument('--mock-server', default=None, metavar='URL',
+                        help="连接本地模拟服务器(python cloud_mock.py)，如 http://127.0.0.1:8765")
+    args = parser.parse_args(argv)
+
+    if args.no_cloud:
+        GLOBAL_CONFIG['cloud_enabled'] = False
+    if args.mock_server:
+        use_mock_server(args.mock_server)
+
+    logging.info("以无界面模式启动智能坐姿监测系统...")
+    app = QCoreApplication(sys.argv[:1])
+    engine = PostureEngine()
+    engine.voice_enabled = not args.no_voice
+    engine.status_update.connect(lambda text, color: logging.info(f"状态: {text}"))
+    engine.upload_complete.connect(lambda url: logging.info(f"截图已上传: {url}"))
+
+    # 收到退出信号时结束事件循环；定时器让Python的信号处理函数有机会执行
+    signal.signal(signal.SIGINT, lambda *_: app.quit())
+    signal.signal(signal.SIGTERM, lambda *_: app.quit())
+    wakeup = QTimer()
+    wakeup.timeout.connect(lambda: None)
+    wakeup.start(500)
+
+    source = args.camera
+    if args.source:
+        try:
+            source = open_source(args.source, realtime=True)
+        except RuntimeError as e:
+            logging.error(str(e))
+            engine.shutdown()
+            return 1
+    if not engine.start_camera(source):
+        logging.error("无法启动摄像头")
+        engine.shutdown()
+        return 1
+    try:
+        return app.exec()
+    finally:
+        engine.shutdown()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# 带缓存的文字叠加层渲染
+#
+# 原先每次绘制中文都要重新加载字体，并对整帧做 BGR→RGB→PIL→RGB→BGR 往返转换。
+# 这里把开销拆成三部分并分别缓存：
+#   FontCache      - 按字号缓存 FreeType 字体对象
+#   TextSprite     - 预渲染好的文字贴图(BGRA)，按 (文字, 字号, 颜色, 背景) 缓存
+#   OverlayRenderer.compose - 一次性把本帧所有贴图以 NumPy alpha 混合到帧上
+# PIL 只在贴图首次出现时用于渲染这一小块区域，不再接触整帧图像。
+import logging
+import threading
+import collections
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+
+class FontCache:
+    """按字号缓存字体，字体文件只在每个字号第一次使用时加载"""
+    def __init__(self, font_path):
+        self.font_path = font_path
+        self.fonts = {}
+        self.lock = threading.Lock()
+
+    def get(self, size):
+        with self.lock:
+            font = self.fonts.get(size)
+            if font is None:
+                try:
+                    font = ImageFont.truetype(self.font_path, size)
+                except Exception as e:
+                    # 回退到默认字体（可能无法显示中文），每个字号只警告一次
+                    logging.warning(f"加载中文字体失败，使用默认字体: {str(e)}")
+                    font = ImageFont.load_default()
+                self.fonts[size] = font
+            return font
+
+
+class TextSprite:
+    """预乘 alpha 的文字贴图，混合时只需一次乘加"""
+    __slots__ = ('premultiplied', 'inverse_alpha', 'width', 'height')
+
+    def __init__(self, bgra):
+        alpha = bgra[..., 3:4].astype(np.uint16)
+        self.premultiplied = bgra[..., :3].astype(np.uint16) * alpha
+        self.inverse_alpha = 255 - alpha
+        self.height, self.width = bgra.shape[:2]
+
+
+class OverlayRenderer:
+    """文字贴图缓存 + 整帧一次性合成"""
+    def __init__(self, font_path, cache_size=512):
+        self.fonts = FontCache(font_path)
+        self.cache_size = cache_size
+        self.sprites = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def sprite(self, text, font_size, color, background=None, padding=0):
+        """获取文字贴图
+
+        color/background 与 PIL 的 fill 参数含义相同 (RGB / RGBA)。
+        无背景时贴图左上角即 PIL draw.text 的绘制位置；有背景时文字四周留 padding 像素。
+        """
+        key = (text, font_size, color, background, padding)
+        with self.lock:
+            sprite = self.sprites.get(key)
+            if sprite is not None:
+                self.sprites.move_to_end(key)
+                self.hits += 1
+                return sprite
+            self.misses += 1
+            sprite = self._render(text, font_size, color, background, padding)
+            self.sprites[key] = sprite
+            if len(self.sprites) > self.cache_size:
+                self.sprites.popitem(last=False)
+            return sprite
+
+    def _render(self, text, font_size, color, background, padding):
+        font = self.fonts.get(font_size)
+        left, top, right, bottom = ImageDraw.Draw(Image.new('RGBA', (1, 1))).textbbox((0, 0), text, font=font)
+        if background is None:
+            # 与 draw.text((x, y)) 的排版保持一致，保留字形上方的留白
+            size, origin = (max(right, 1), max(bottom, 1)), (0, 0)
+        else:
+            size = (right - left + 2 * padding, bottom - top + 2 * padding)
+            origin = (padding - left, padding - top)
+        canvas = Image.new('RGBA', size, (0, 0, 0, 0) if background is None else background)
+        ImageDraw.Draw(canvas).text(origin, text, font=font, fill=color)
+        rgba = np.asarray(canvas)
+        return TextSprite(rgba[..., [2, 1, 0, 3]])
+
+    def compose(self, image, overlays):
+        """把 [(贴图, (x, y)), ...] 一次性 alpha 混合到 BGR 图像上(原地修改)，返回该图像"""
+        h, w = image.shape[:2]
+        for sprite, (x, y) in overlays:
+            x0, y0 = max(int(x), 0), max(int(y), 0)
+            x1, y1 = min(int(x) + sprite.width, w), min(int(y) + sprite.height, h)
+            if x0 >= x1 or y0 >= y1:
+                continue
+            sx, sy = x0 - int(x), y0 - int(y)
+            region = image[y0:y1, x0:x1]
+            blended = region * sprite.inverse_alpha[sy:sy + y1 - y0, sx:sx + x1 - x0]
+            blended += sprite.premultiplied[sy:sy + y1 - y0, sx:sx + x1 - x0]
+            blended += 127
+            region[:] = blended // 255
+        return image
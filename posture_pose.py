@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# 姿势模型与推理输入
+#
+# 主程序(posture_engine.py)和离线基准测试(posture_bench.py)共用的模型创建和缩放规则，
+# 保证基准测试测到的就是实际运行的推理流程。本模块不依赖界面、音频和云服务。
+# 使用前需先设置 XNNPACK_DELEGATE 环境变量(见主程序开头)。
+import cv2
+import mediapipe as mp
+
+
+def fit_to_size(image, max_width, max_height):
+    """等比例缩小图像使其不超过给定尺寸(不放大)
+
+    等比缩放不改变归一化坐标，因此在缩小后的图像上得到的关键点可直接用于原图。
+    """
+    h, w = image.shape[:2]
+    scale = min((max_width or w) / w, (max_height or h) / h)
+    if scale >= 1:
+        return image
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def create_pose(complexity):
+    """创建指定复杂度的MediaPipe姿势模型"""
+    return mp.solutions.pose.Pose(
+        static_image_mode=False,
+        model_complexity=complexity,
+        min_detection_confidence=0.7,
+        min_tracking_confidence=0.7
+    )
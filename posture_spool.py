@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+# 离线上传缓存
+#
+# 网络不可用时截图不再丢失：图片写入缓存目录，任务记录追加写入日志文件(journal.log，每行一个JSON)。
+#   add      - 新截图(可能已上传到COS、只差数据库记录)，附带调用方的字段(如访问地址)
+#   url      - 已上传到COS，记录访问地址等字段，重试时不再重复上传
+#   done     - 上传和数据库记录均已完成，文件已删除
+#   evict    - 超出容量上限，最旧的截图被淘汰
+#   failed   - 多次补传失败，文件改名为 <文件名>.failed 留待人工检查
+# 启动时重放日志恢复未完成的任务，删除日志中没有记录的文件(.failed 文件除外)，并压缩日志。
+# 后台线程按加入顺序逐个上传，失败时按指数退避等待后重试队首任务；
+# 同一任务因网络以外的原因(文件损坏、服务器拒绝等)失败 max_attempts 次后移出队列，不再阻塞后面的任务。
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+import collections
+
+JOURNAL_NAME = 'journal.log'
+
+
+class UploadSpool:
+    """磁盘缓存的上传队列，按加入顺序补传"""
+    def __init__(self, directory, max_bytes, upload, on_uploaded=None, retry_base=5.0, retry_max=300.0,
+                 max_attempts=10, network_errors=()):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.upload = upload                  # 上传函数: (记录, 文件路径) -> 访问地址，失败抛出异常
+        self.on_uploaded = on_uploaded        # 补传成功回调: 访问地址 -> None
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.max_attempts = max_attempts      # 同一任务非网络原因失败的最多次数
+        self.network_errors = network_errors  # 网络不可用的异常类型，不计入失败次数
+        self.entries = collections.OrderedDict()
+        self.total_bytes = 0
+        self.dead_records = 0                 # 日志中已失效的记录数，用于决定何时压缩
+        self.draining_id = None               # 正在补传的任务，不会被淘汰
+        self.counters = {'spooled': 0, 'drained': 0, 'evicted': 0, 'errors': 0, 'failed': 0}
+        self.failures = 0                     # 队首任务连续失败次数
+        self.attempts = (None, 0)             # (任务ID, 非网络原因失败次数)
+        self.next_attempt = 0
+        self.cond = threading.Condition()
+        self.running = True
+        os.makedirs(directory, exist_ok=True)
+        self.journal_path = os.path.join(directory, JOURNAL_NAME)
+        self._recover()
+        self.journal = open(self.journal_path, 'a', encoding='utf-8')
+        self.thread = threading.Thread(target=self._drain_loop, name="spool-drainer", daemon=True)
+        self.thread.start()
+
+    def _recover(self):
+        """重放日志，恢复未完成的任务并清理孤立文件"""
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue                  # 断电时最后一行可能不完整
+                    op = record.get('op')
+                    if op == 'add':
+                        self.entries[record['id']] = {k: v for k, v in record.items() if k != 'op'}
+                    elif op == 'url' and record['id'] in self.entries:
+                        self.entries[record['id']].update(
+                            {k: v for k, v in record.items() if k not in ('op', 'id')})
+                    elif op in ('done', 'evict', 'failed'):
+                        self.entries.pop(record['id'], None)
+        for entry_id, entry in list(self.entries.items()):
+            if not os.path.isfile(self.path(entry)):
+                logging.warning(f"离线缓存文件丢失，已跳过: {entry['file']}")
+                del self.entries[entry_id]
+        known = {entry['file'] for entry in self.entries.values()} | {JOURNAL_NAME}
+        for name in os.listdir(self.directory):
+            if name not in known and not name.endswith('.failed'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+        self.total_bytes = sum(entry['size'] for entry in self.entries.values())
+        self._rewrite_journal()
+        if self.entries:
+            logging.info(f"离线缓存中有{len(self.entries)}张截图待补传")
+
+    def _rewrite_journal(self):
+        """只保留仍有效的任务，先写临时文件再替换"""
+        temp_path = self.journal_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(dict(entry, op='add'), ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.journal_path)
+        self.dead_records = 0
+
+    def _append(self, record):
+        """追加一条日志记录并落盘(调用方持有锁)"""
+        if self.journal.closed:
+            return                            # 已停止：未记录的完成状态下次启动时重新补传
+        self.journal.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+        if record['op'] != 'add':
+            self.dead_records += 1
+        if self.dead_records > 100 and self.dead_records > 2 * len(self.entries):
+            self.journal.close()
+            self._rewrite_journal()
+            self.journal = open(self.journal_path, 'a', encoding='utf-8')
+
+    def path(self, entry):
+        return os.path.join(self.directory, entry['file'])
+
+    def add_bytes(self, data, created, fields=None, suffix='.jpg'):
+        """把内存中的截图写入缓存，fields随记录保存(如已上传的访问地址)，返回是否已缓存"""
+        def store(path):
+            with open(path, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        return self._add(store, len(data), suffix, created, fields)
+
+    def add_file(self, source_path, created, fields=None):
+        """把已有的截图文件移入缓存，返回是否已缓存"""
+        size = os.path.getsize(source_path)
+        stored = self._add(lambda path: shutil.move(source_path, path), size,
+                           os.path.splitext(source_path)[1], created, fields)
+        if not stored and os.path.exists(source_path):
+            os.remove(source_path)
+        return stored
+
+    def _add(self, store, size, suffix, created, fields):
+        """超出容量时先淘汰最旧的截图，再保存文件并追加日志记录"""
+        if size > self.max_bytes:
+            logging.warning(f"截图超过离线缓存容量上限，已丢弃: {created}")
+            return False
+        with self.cond:
+            if not self.running:
+                return False
+            self._evict(size)
+            entry_id = f"{time.time_ns():x}"
+            name = entry_id + suffix
+            store(os.path.join(self.directory, name))
+            entry = {'id': entry_id, 'file': name, 'size': size, 'time': created}
+            entry.update(fields or {})
+            self._append(dict(entry, op='add'))
+            self.entries[entry_id] = entry
+            self.total_bytes += size
+            self.counters['spooled'] += 1
+            self.cond.notify()
+        logging.info(f"截图已存入离线缓存，待补传{len(self.entries)}张")
+        return True
+
+    def _evict(self, incoming):
+        """淘汰最旧的截图直到放得下新文件(调用方持有锁)"""
+        for entry_id in list(self.entries):
+            if self.total_bytes + incoming <= self.max_bytes:
+                return
+            if entry_id == self.draining_id:
+                continue
+            entry = self.entries.pop(entry_id)
+            self.total_bytes -= entry['size']
+            self.counters['evicted'] += 1
+            self._append({'op': 'evict', 'id': entry_id})
+            try:
+                os.remove(self.path(entry))
+            except OSError:
+                pass
+            logging.warning(f"离线缓存已满，淘汰最旧的截图: {entry['time']}")
+
+    def mark_uploaded(self, entry_id, **fields):
+        """记录已上传到COS的访问地址等字段，之后只需补写数据库"""
+        with self.cond:
+            entry = self.entries.get(entry_id)
+            if entry is not None:
+                entry.update(fields)
+                self._append(dict(fields, op='url', id=entry_id))
+
+    def pending(self):
+        with self.cond:
+            return len(self.entries)
+
+    def _drain_loop(self):
+        while True:
+            with self.cond:
+                while self.running and (not self.entries or time.monotonic() < self.next_attempt):
+                    timeout = self.next_attempt - time.monotonic() if self.entries else None
+                    self.cond.wait(timeout)
+                if not self.running:
+                    return
+                entry = dict(next(iter(self.entries.values())))
+                self.draining_id = entry['id']
+            try:
+                url = self.upload(entry, self.path(entry))
+            except Exception as e:
+                with self.cond:
+                    self.draining_id = None
+                    self.counters['errors'] += 1
+                    failed = False
+                    if not isinstance(e, self.network_errors):
+                        attempts = self.attempts[1] + 1 if self.attempts[0] == entry['id'] else 1
+                        self.attempts = (entry['id'], attempts)
+                        failed = attempts >= self.max_attempts
+                    if failed:
+                        self._quarantine(entry)
+                        self.failures = 0
+                        self.next_attempt = 0
+                    else:
+                        self.failures += 1
+                        delay = min(self.retry_max, self.retry_base * 2 ** (self.failures - 1))
+                        self.next_attempt = time.monotonic() + delay
+                if failed:
+                    logging.error(f"离线缓存补传{attempts}次失败，已移出队列: {self.path(entry)}.failed ({str(e)})")
+                else:
+                    logging.warning(f"离线缓存补传失败，{delay:.1f}秒后重试: {str(e)}")
+                continue
+            with self.cond:
+                self.draining_id = None
+                self.failures = 0
+                self.next_attempt = 0
+                if self.entries.pop(entry['id'], None) is not None:
+                    self.total_bytes -= entry['size']
+                    self.counters['drained'] += 1
+                    self._append({'op': 'done', 'id': entry['id']})
+                try:
+                    os.remove(self.path(entry))
+                except OSError:
+                    pass
+            if self.on_uploaded:
+                self.on_uploaded(url)
+
+    def _quarantine(self, entry):
+        """多次失败的任务移出队列，文件改名为 .failed 保留(调用方持有锁)"""
+        if self.entries.pop(entry['id'], None) is None:
+            return
+        self.total_bytes -= entry['size']
+        self.counters['failed'] += 1
+        self._append({'op': 'failed', 'id': entry['id']})
+        try:
+            os.replace(self.path(entry), self.path(entry) + '.failed')
+        except OSError:
+            pass
+
+    def metrics(self):
+        with self.cond:
+            result = dict(self.counters)
+            result['pending'] = len(self.entries)
+            result['bytes'] = self.total_bytes
+        return result
+
+    def stop(self, timeout=5.0):
+        """停止补传线程并关闭日志，未补传的截图留待下次启动"""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.thread.join(timeout)
+        with self.cond:
+            self.journal.close()
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# 姿势骨架遥测
+#
+# 只需要姿势证据而不需要照片时，用量化后的关键点代替截图：
+#   33个关键点 × (x: uint16, y: uint16, visibility: uint8) = 165字节，Base64后220个字符
+# 连同姿势警告和指标值直接写入云开发数据库，不经过COS，小程序端据此绘制骨架。
+# 坐标为全帧归一化坐标，量化误差不超过画面边长的 1/65535。
+import base64
+import numpy as np
+from posture_metrics import NUM_LANDMARKS
+
+SKELETON_FORMAT = 'q16v8'
+_POINT = np.dtype([('x', '<u2'), ('y', '<u2'), ('v', 'u1')])
+
+
+def quantize_landmarks(landmarks):
+    """(33,4) 关键点数组(x, y, z, visibility) -> 165字节"""
+    points = np.empty(NUM_LANDMARKS, dtype=_POINT)
+    points['x'] = np.round(np.clip(landmarks[:, 0], 0, 1) * 65535)
+    points['y'] = np.round(np.clip(landmarks[:, 1], 0, 1) * 65535)
+    points['v'] = np.round(np.clip(landmarks[:, 3], 0, 1) * 255)
+    return points.tobytes()
+
+
+def dequantize_landmarks(data):
+    """quantize_landmarks 的逆运算，返回 (33,3) 数组(x, y, visibility)"""
+    points = np.frombuffer(data, dtype=_POINT)
+    return np.stack([points['x'] / 65535, points['y'] / 65535, points['v'] / 255], axis=1)
+
+
+def build_skeleton_record(landmarks, warnings, metrics, frame_size, captured_at):
+    """生成写入数据库的骨架记录，frame_size为 (宽, 高)，小程序按原画面比例绘制"""
+    return {
+        'kind': 'skeleton',
+        'format': SKELETON_FORMAT,
+        'skeleton': base64.b64encode(quantize_landmarks(landmarks)).decode('ascii'),
+        'width': int(frame_size[0]),
+        'height': int(frame_size[1]),
+        'posture_warnings': list(warnings),
+        'metrics': {name: round(float(value), 2) for name, value in metrics.items()},
+        'upload_time': captured_at
+    }
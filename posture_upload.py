@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+# 截图上传工作池
+#
+# 所有截图上传(自动截图、手动截图、云端截图指令)共用一个有界任务队列和固定数量的工作线程，
+# 不再为每次截图新建线程与姿势模型争抢CPU。
+#   - 高优先级通道：手动截图和云端指令优先执行，队列满时挤掉最旧的普通任务
+#   - 失败重试：按指数退避(加随机抖动)延迟后重新排队，超过最大次数后放弃
+#   - 丢弃回调：队列满被丢弃或退出时仍未执行的任务交给 on_drop，由调用方转存(如离线缓存)；
+#     队列满时的丢弃回调在单独的线程中执行，提交任务的线程(如推理线程)不会被转存阻塞
+#   - 指标：队列深度、执行中数量、完成/失败/重试/丢弃计数、从提交到完成的耗时分布
+import time
+import queue
+import heapq
+import random
+import logging
+import itertools
+import threading
+from posture_diagnostics import RollingHistogram
+
+PRIORITY_HIGH = 0                             # 手动截图、云端指令
+PRIORITY_NORMAL = 1                           # 自动截图
+
+
+class UploadJob:
+    """一个上传任务：run() 成功返回结果，失败抛出异常"""
+    def __init__(self, run, name, priority=PRIORITY_NORMAL, on_success=None, on_failure=None, on_drop=None):
+        self.run = run
+        self.name = name
+        self.priority = priority
+        self.on_success = on_success          # 成功回调: result -> None
+        self.on_failure = on_failure          # 最终失败回调: exception -> None
+        self.on_drop = on_drop                # 未执行完就被丢弃时的回调: () -> None
+        self.attempts = 0
+        self.submit_time = time.perf_counter()
+
+
+class UploadPool:
+    """有界优先级任务队列 + 固定数量的工作线程"""
+    def __init__(self, workers=1, queue_size=8, max_retries=3, backoff_base=2.0, backoff_max=60.0,
+                 metrics_window=100):
+        self.max_queue = queue_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.ready = []                       # 可立即执行的任务堆: (优先级, 序号, 任务)
+        self.delayed = []                     # 等待重试的任务堆: (可执行时间, 序号, 任务)
+        self.sequence = itertools.count()
+        self.cond = threading.Condition()
+        self.running = True
+        self.active = 0                       # 正在执行的任务数
+        self.counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'retried': 0, 'dropped': 0}
+        self.latency = RollingHistogram(metrics_window)
+        self.drops = queue.Queue()            # 等待调用 on_drop 的被丢弃任务，None 表示结束
+        self.threads = [threading.Thread(target=self._worker, name=f"upload-{i}", daemon=True)
+                        for i in range(workers)]
+        self.drop_thread = threading.Thread(target=self._drop_loop, name="upload-drop", daemon=True)
+        for t in self.threads + [self.drop_thread]:
+            t.start()
+
+    def submit(self, job):
+        """提交任务，队列已满且无法挤出普通任务时返回False
+
+        被丢弃的任务(新任务或被挤出的旧任务)交给丢弃线程调用其 on_drop，本方法不等待。
+        """
+        with self.cond:
+            if not self.running:
+                return False
+            dropped = None
+            if len(self.ready) + len(self.delayed) >= self.max_queue:
+                dropped = self._drop_oldest_normal() if job.priority == PRIORITY_HIGH else None
+                if dropped is None:
+                    dropped = job
+                self.counters['dropped'] += 1
+                logging.warning(f"上传队列已满，丢弃任务: {dropped.name}")
+            if dropped is not job:
+                self.counters['submitted'] += 1
+                heapq.heappush(self.ready, (job.priority, next(self.sequence), job))
+                self.cond.notify()
+        if dropped is not None and dropped.on_drop:
+            self.drops.put(dropped)
+        return dropped is not job
+
+    def _drop_loop(self):
+        """丢弃线程：依次调用被丢弃任务的 on_drop"""
+        while True:
+            job = self.drops.get()
+            if job is None:
+                return
+            try:
+                job.on_drop()
+            except Exception as e:
+                logging.error(f"处理被丢弃的任务失败: {job.name} ({e})")
+
+    def _drop_oldest_normal(self):
+        """为高优先级任务腾出位置：取出最早提交的一个普通任务，没有时返回None"""
+        candidates = [(seq, i) for i, (priority, seq, _) in enumerate(self.ready) if priority != PRIORITY_HIGH]
+        if not candidates:
+            return None
+        _, index = min(candidates)
+        job = self.ready.pop(index)[2]
+        heapq.heapify(self.ready)
+        return job
+
+    def _next_job(self):
+        """取出下一个可执行的任务，没有时等待；停止后返回None"""
+        with self.cond:
+            while self.running:
+                now = time.perf_counter()
+                while self.delayed and self.delayed[0][0] <= now:
+                    _, seq, job = heapq.heappop(self.delayed)
+                    heapq.heappush(self.ready, (job.priority, seq, job))
+                if self.ready:
+                    self.active += 1
+                    return heapq.heappop(self.ready)[2]
+                timeout = self.delayed[0][0] - now if self.delayed else None
+                self.cond.wait(timeout)
+            return None
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            job.attempts += 1
+            try:
+                result = job.run()
+            except Exception as e:
+                self._handle_failure(job, e)
+            else:
+                with self.cond:
+                    self.active -= 1
+                    self.counters['completed'] += 1
+                    self.latency.add(time.perf_counter() - job.submit_time)
+                if job.on_success:
+                    job.on_success(result)
+
+    def _handle_failure(self, job, error):
+        with self.cond:
+            self.active -= 1
+            if job.attempts <= self.max_retries and self.running:
+                # 指数退避，加±20%抖动避免多台设备同时重试
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (job.attempts - 1))
+                delay *= random.uniform(0.8, 1.2)
+                self.counters['retried'] += 1
+                heapq.heappush(self.delayed, (time.perf_counter() + delay, next(self.sequence), job))
+                self.cond.notify()
+                logging.warning(f"上传失败，{delay:.1f}秒后第{job.attempts}次重试: {job.name} ({error})")
+                return
+            self.counters['failed'] += 1
+        logging.error(f"上传失败，已放弃: {job.name} ({error})")
+        if job.on_failure:
+            job.on_failure(error)
+
+    def metrics(self):
+        """队列深度、计数和耗时统计"""
+        with self.cond:
+            result = dict(self.counters)
+            result['queued'] = len(self.ready)
+            result['retry_waiting'] = len(self.delayed)
+            result['active'] = self.active
+            result['latency_ms'] = self.latency.summary()
+        return result
+
+    def pending_jobs(self):
+        """尚未执行的任务(按优先级和提交顺序)"""
+        with self.cond:
+            entries = sorted(self.ready) + sorted((job.priority, seq, job) for _, seq, job in self.delayed)
+        return [job for _, _, job in entries]
+
+    def stop(self, timeout=5.0):
+        """停止接收任务，等待正在执行的任务结束；未执行的任务调用 on_drop 后返回"""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        deadline = time.perf_counter() + timeout
+        for t in self.threads:
+            t.join(max(0, deadline - time.perf_counter()))
+        # 先处理完此前被丢弃的任务，再处理剩余任务，保持转存顺序
+        self.drops.put(None)
+        self.drop_thread.join()
+        remaining = self.pending_jobs()
+        with self.cond:
+            self.ready, self.delayed = [], []
+        for job in remaining:
+            if job.on_drop:
+                job.on_drop()
+        return remaining
+
+
+class RecordBatcher:
+    """数据库记录合并写入：时间窗口内的多条记录合并为一次请求(写后返回，不阻塞上传线程)
+
+    第一条记录到达后最多等待 window 秒或攒满 batch_size 条即写入；
+    写入失败的整批记录交给 on_failed 处理(如转存离线缓存)，停止时写完剩余记录；
+    停止超时仍未写出的记录同样交给 on_failed。
+    """
+    def __init__(self, write, batch_size=10, window=2.0, on_written=None, on_failed=None, metrics_window=100):
+        self.write = write                    # 写入函数: 记录列表 -> None，失败抛出异常
+        self.batch_size = batch_size
+        self.window = window
+        self.on_written = on_written          # 写入成功回调: 记录列表 -> None
+        self.on_failed = on_failed            # 写入失败回调: (记录列表, 异常) -> None
+        self.records = []
+        self.first_time = 0                   # 当前批次第一条记录到达的时间
+        self.writing = 0                      # 正在写入的记录数
+        self.cond = threading.Condition()
+        self.running = True
+        self.counters = {'records': 0, 'batches': 0, 'failed_batches': 0}
+        self.latency = RollingHistogram(metrics_window)
+        self.thread = threading.Thread(target=self._loop, name="record-batcher", daemon=True)
+        self.thread.start()
+
+    def add(self, record):
+        """加入一条记录，已停止时返回False"""
+        with self.cond:
+            if not self.running:
+                return False
+            if not self.records:
+                self.first_time = time.perf_counter()
+            self.records.append(record)
+            self.cond.notify()
+            return True
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                while self.running and not self.records:
+                    self.cond.wait()
+                # 攒批：停止时不再等待，立即写出剩余记录
+                while self.running and len(self.records) < self.batch_size:
+                    remaining = self.first_time + self.window - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+                if not self.records:
+                    return
+                batch = self.records[:self.batch_size]
+                del self.records[:self.batch_size]
+                self.first_time = time.perf_counter()
+                self.writing = len(batch)
+            self._write(batch)
+            with self.cond:
+                self.writing = 0
+
+    def _write(self, batch):
+        start = time.perf_counter()
+        try:
+            self.write(batch)
+        except Exception as e:
+            with self.cond:
+                self.counters['failed_batches'] += 1
+            logging.error(f"批量写入{len(batch)}条记录失败: {str(e)}")
+            if self.on_failed:
+                self.on_failed(batch, e)
+            return
+        with self.cond:
+            self.counters['batches'] += 1
+            self.counters['records'] += len(batch)
+            self.latency.add(time.perf_counter() - start)
+        if self.on_written:
+            self.on_written(batch)
+
+    def metrics(self):
+        with self.cond:
+            result = dict(self.counters)
+            result['pending'] = len(self.records)
+            result['avg_batch'] = round(result['records'] / result['batches'], 2) if result['batches'] else None
+            result['latency_ms'] = self.latency.summary()
+        return result
+
+    def stop(self, timeout=30.0):
+        """停止接收记录并写完剩余记录；超时后还没开始写的记录交给 on_failed"""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.thread.join(timeout)
+        if not self.thread.is_alive():
+            return
+        with self.cond:
+            remaining, self.records = self.records, []
+            writing = self.writing
+        logging.warning(f"批量写入{timeout}秒内未完成: {writing}条记录仍在写入，{len(remaining)}条记录未写出")
+        if remaining and self.on_failed:
+            self.on_failed(remaining, TimeoutError("停止时未写出"))
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# 视频显示控件
+#
+# 渲染线程先用 cv2.resize 把帧一次性缩放到控件的设备像素尺寸，界面线程只需：
+#   1. 用 QImage 直接包装 BGR 帧缓冲区(Format_BGR888，不做颜色转换也不复制)
+#   2. 在 paintEvent 中 1:1 绘制，不再经过 QPixmap 转换和 SmoothTransformation 缩放
+# 可选的 OpenGL 后端基于 QOpenGLWidget，QPainter 把帧作为纹理上传后绘制，
+# 在只有 Mesa 软件渲染(llvmpipe)的板子上也可使用。
+import time
+import logging
+import cv2
+from PySide6.QtCore import Qt, QPointF, QRectF
+from PySide6.QtGui import QImage, QPainter, QColor, QPen
+from PySide6.QtWidgets import QWidget
+
+try:
+    from PySide6.QtOpenGLWidgets import QOpenGLWidget
+except ImportError:
+    QOpenGLWidget = None
+
+
+def resize_to_fit(image, width, height, smooth=False):
+    """等比例缩放(可放大)到不超过给定尺寸，尺寸已合适时原样返回
+
+    默认使用双线性插值；smooth=True 时缩小使用 INTER_AREA，画质更好但1080p输入约慢10ms。
+    """
+    h, w = image.shape[:2]
+    if width <= 0 or height <= 0:
+        return image
+    scale = min(width / w, height / h)
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    if size == (w, h):
+        return image
+    interpolation = cv2.INTER_AREA if smooth and scale < 1 else cv2.INTER_LINEAR
+    return cv2.resize(image, size, interpolation=interpolation)
+
+
+class _VideoPainter:
+    """两种显示控件共用的状态与绘制逻辑"""
+    def _init_video(self):
+        self.frame = None                     # 当前帧(BGR)，QImage 直接引用其内存
+        self.image = None
+        self.message = ""
+        self.timers = None                    # 阶段耗时统计(StageTimers)
+        self.device_size = (0, 0)             # 控件的设备像素尺寸，供渲染线程读取
+
+    def target_size(self):
+        """渲染线程调用：帧应缩放到的设备像素尺寸"""
+        return self.device_size
+
+    def set_frame(self, frame):
+        """界面线程：显示一帧已缩放好的BGR图像(不复制)"""
+        start = time.perf_counter()
+        h, w = frame.shape[:2]
+        image = QImage(frame.data, w, h, frame.strides[0], QImage.Format_BGR888)
+        image.setDevicePixelRatio(self.devicePixelRatioF())
+        self.frame = frame                    # 保持缓冲区存活直到下一帧替换
+        self.image = image
+        if self.timers:
+            self.timers.record('qimage', time.perf_counter() - start)
+        self.update()
+
+    def show_message(self, text):
+        self.frame = None
+        self.image = None
+        self.message = text
+        self.update()
+
+    def _update_device_size(self):
+        ratio = self.devicePixelRatioF()
+        self.device_size = (int(self.width() * ratio), int(self.height() * ratio))
+
+    def _paint(self, painter):
+        start = time.perf_counter()
+        painter.fillRect(self.rect(), Qt.black)
+        if self.image is not None:
+            # 帧已是设备像素尺寸，居中 1:1 绘制
+            size = self.image.deviceIndependentSize()
+            x = (self.width() - size.width()) / 2
+            y = (self.height() - size.height()) / 2
+            painter.drawImage(QPointF(x, y), self.image)
+        elif self.message:
+            painter.setPen(QColor("white"))
+            painter.drawText(self.rect(), Qt.AlignCenter, self.message)
+        painter.setPen(QPen(QColor("#444"), 2))
+        painter.drawRect(QRectF(self.rect()).adjusted(1, 1, -1, -1))
+        if self.timers and self.image is not None:
+            self.timers.record('scale', time.perf_counter() - start)
+
+
+class VideoView(QWidget, _VideoPainter):
+    """软件光栅显示控件"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._init_video()
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+
+    def resizeEvent(self, event):
+        self._update_device_size()
+        super().resizeEvent(event)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        self._paint(painter)
+        painter.end()
+
+
+if QOpenGLWidget is not None:
+    class GLVideoView(QOpenGLWidget, _VideoPainter):
+        """OpenGL显示控件，帧通过纹理上传绘制"""
+        def __init__(self, parent=None):
+            super().__init__(parent)
+            self._init_video()
+
+        def resizeEvent(self, event):
+            # 不依赖resizeGL，上下文尚未创建时也能更新尺寸
+            self._update_device_size()
+            super().resizeEvent(event)
+
+        def paintGL(self):
+            painter = QPainter(self)
+            self._paint(painter)
+            painter.end()
+else:
+    GLVideoView = None
+
+
+def create_video_view(backend='raster', parent=None):
+    """按配置创建显示控件，OpenGL 不可用时回退到软件光栅"""
+    if backend == 'opengl':
+        if GLVideoView is not None:
+            return GLVideoView(parent)
+        logging.warning("当前环境不支持QOpenGLWidget，使用软件光栅显示")
+    return VideoView(parent)
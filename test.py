@@ -3,8 +3,13 @@ import sys
 import tempfile
 import subprocess
 import asyncio
-import requests
-import json
+import cloud_http
+from cloud_token import TOKEN_URL, DEFAULT_CACHE_FILE, token_service
+from cloud_commands import CommandPoller
+from cloud_async import AsyncCloudClient
+from command_executor import AsyncCommandExecutor, PRIORITIES, PRIORITY_NORMAL
+from command_ledger import DEFAULT_LEDGER_FILE, CommandLedger
+from cloud_mock import apply_mock_endpoints
 import serial
 import threading
 import time
@@ -22,22 +27,45 @@ from PySide6.QtWidgets import (
 
 # 全局配置
 CONFIG = {
-    'poll_interval': 1,                 # 云指令轮询间隔(秒)
+    'poll_interval': 1,                 # 云指令轮询间隔(秒)，有新指令后使用该间隔
+    'poll_max_interval': 10,            # 空闲时轮询间隔逐渐放大到的上限(秒)
+    'poll_page_size': 10,               # 每页查询的指令数
+    'mark_retries': 3,                  # 标记指令完成失败后，在之后的轮询中重试的次数
     'cmd_timeout': 60,                  # 系统命令执行超时时间(秒)
     'cloud_enabled': True,              # 是否启用云服务
+    'mock_server': '',                  # 本地模拟服务器地址(如 http://127.0.0.1:8765，见 cloud_mock.py)，为空时连接真实服务
     'serial_enabled': True,             # 是否启用串口监听
     'serial_port': '/dev/ttyS9',        # 串口设备
     'serial_baudrate': 9600,            # 串口波特率
 
+    'executor': {                       # 远程脚本执行器(与坐姿检测共用板子，限制脚本占用的资源)
+        'workers': 2,                   # 同时执行的脚本数
+        'queue_size': 20,               # 排队上限，满时拒绝新指令
+        'cpu_seconds': 0,               # 每个脚本的CPU时间上限(秒，0为不限，指令可单独指定)
+        'memory_mb': 0,                 # 每个脚本的内存上限(MB，0为不限，指令可单独指定)
+        'nice': 10,                     # 脚本进程的nice值，让出CPU给实时任务
+        'tail_bytes': 2000              # 写回云端记录的标准输出/错误尾部字节数
+    },
+
+    'ledger': {                         # 已执行指令记录(与坐姿监测共用，重启后不重复执行)
+        'file': DEFAULT_LEDGER_FILE,
+        'max_entries': 5000,            # 最多保留的指令ID数
+        'ttl': 7 * 24 * 3600            # 指令ID保留时间(秒)
+    },
+
     'wx_cloud': {                       # 微信云开发配置
         'env_id': 'cloud1-5gxtsztod863880c',
-        'access_token': '',             # 访问令牌(动态刷新)
+        'token_cache': DEFAULT_CACHE_FILE,  # 访问令牌共享缓存文件(与坐姿监测共用)
+        'token_url': TOKEN_URL,         # 获取访问令牌的接口
         'api_url': 'https://api.weixin.qq.com/tcb/databasequery',
         'appid': '',
         'secret': ''
     }
 }
 
+if CONFIG['mock_server']:
+    apply_mock_endpoints(CONFIG['mock_server'], CONFIG['wx_cloud'])
+
 # 设备状态管理
 device_state = {
     'last_command': {                   # 最近执行的指令
@@ -98,6 +126,12 @@ class BackgroundService:
         self.running = True
         self.serial_thread = None
         self.cloud_thread = None
+        self.tokens = None
+        self.poller = None
+        self.client = None
+        self.executor = None
+        self.ledger = CommandLedger(CONFIG['ledger']['file'], CONFIG['ledger']['max_entries'],
+                                    CONFIG['ledger']['ttl'])
         
     def start(self):
         """启动后台服务"""
@@ -114,6 +148,8 @@ class BackgroundService:
     def stop(self):
         """停止后台服务"""
         self.running = False
+        if self.tokens is not None:
+            self.tokens.stop()
         
     def run_serial_listener(self):
         """运行串口监听"""
@@ -172,84 +208,89 @@ class BackgroundService:
         loop.run_until_complete(self.cloud_service_loop())
     
     async def cloud_service_loop(self):
-        """云服务主循环"""
-        while self.running and CONFIG['cloud_enabled']:
-            commands = await self.poll_cloud_commands()
-            for cmd in commands:
-                await self.execute_command(cmd)
-            await asyncio.sleep(CONFIG['poll_interval'])
-    
-    async def refresh_token(self):
-        """刷新微信云开发访问令牌"""
+        """云服务主循环：轮询、执行和标记互不阻塞，脚本在后台任务中运行"""
+        self.client = AsyncCloudClient(CONFIG['wx_cloud']['api_url'], CONFIG['wx_cloud']['env_id'],
+                                       self.token_service())
+        cfg = CONFIG['executor']
+        self.executor = AsyncCommandExecutor(
+            workers=cfg['workers'],
+            timeout=CONFIG['cmd_timeout'],
+            cwd='/home/elf/main',
+            limits={'cpu_seconds': cfg['cpu_seconds'], 'memory_mb': cfg['memory_mb'], 'nice': cfg['nice']},
+            queue_size=cfg['queue_size'],
+            tail_bytes=cfg['tail_bytes']
+        )
+        tasks = set()
         try:
-            res = requests.get(
-                "https://api.weixin.qq.com/cgi-bin/token",
-                params={
-                    'grant_type': 'client_credential',
-                    'appid': CONFIG['wx_cloud']['appid'],
-                    'secret': CONFIG['wx_cloud']['secret']
-                }
-            )
-            res.raise_for_status()
-            CONFIG['wx_cloud']['access_token'] = res.json()['access_token']
-            print(f"Token刷新成功")
-        except Exception as e:
-            print(f"Token刷新失败: {e}")
-            CONFIG['wx_cloud']['access_token'] = ''
+            while self.running and CONFIG['cloud_enabled']:
+                commands = await self.poll_cloud_commands()
+                for cmd in commands:
+                    task = asyncio.create_task(self.execute_command(cmd))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                # 有新指令后快速轮询，空闲时逐渐放慢
+                await asyncio.sleep(self.command_poller().next_interval(bool(commands)))
+        finally:
+            # 服务停止时终止仍在运行的脚本
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.executor.stop()
+            await self.client.close()
     
-    async def poll_cloud_commands(self):
-        """从微信云开发查询最新指令"""
-        if not CONFIG['wx_cloud']['access_token']:
-            await self.refresh_token()
+    def token_service(self):
+        """共享的访问令牌服务(首次使用时创建并启动后台刷新)"""
+        if self.tokens is None:
+            self.tokens = token_service(CONFIG['wx_cloud']['appid'], CONFIG['wx_cloud']['secret'],
+                                        CONFIG['wx_cloud']['token_cache'], token_url=CONFIG['wx_cloud']['token_url'])
+        return self.tokens
     
-        try:
-            # 查询最新指令(按时间戳倒序)
-            query = {
-                "env": CONFIG['wx_cloud']['env_id'],
-                "query": "db.collection('commands')"
-                         ".orderBy('timestamp', 'desc')"
-                         ".limit(1)"
-                         ".get()"
-            }
-    
-            res = requests.post(
-                f"{CONFIG['wx_cloud']['api_url']}?access_token={CONFIG['wx_cloud']['access_token']}",
-                json=query,
-                timeout=10
+    def command_poller(self):
+        """增量指令轮询器(首次使用时创建)"""
+        if self.poller is None:
+            self.poller = CommandPoller(
+                self.client.query,
+                page_size=CONFIG['poll_page_size'],
+                min_interval=CONFIG['poll_interval'],
+                max_interval=CONFIG['poll_max_interval']
             )
-            res.raise_for_status()
-    
-            # 解析查询结果
-            data = res.json().get('data', [])
-            if not data:
-                return []
-    
-            # 处理查询结果格式
-            latest = json.loads(data[0]) if isinstance(data[0], str) else data[0]
-            return [latest] if isinstance(latest, dict) else []
+        return self.poller
     
+    async def poll_cloud_commands(self):
+        """从微信云开发增量查询游标之后的未完成指令"""
+        try:
+            return await self.command_poller().fetch_async()
         except Exception as e:
             print(f"查询指令失败: {e}")
             return []
     
-    async def mark_command_executed(self, cmd_id):
-        """标记云指令为已执行状态"""
+    async def mark_command_executed(self, cmd_id, result=None):
+        """标记云指令为已执行状态，result为执行结果(状态、返回码、输出尾部)，返回是否成功"""
         try:
-            requests.post(
-                f"{CONFIG['wx_cloud']['api_url']}?access_token={CONFIG['wx_cloud']['access_token']}",
-                json={
-                    "env": CONFIG['wx_cloud']['env_id'],
-                    "query": f"db.collection('commands').doc('{cmd_id}').update({{data:{{status:'completed'}}}})"
-                }
-            )
-        except Exception:
-            pass
+            await self.client.update_status('commands', cmd_id, fields={'result': result} if result else None)
+            return True
+        except Exception as e:
+            print(f"标记指令失败: {e}")
+            return False
+    
+    def retry_mark(self, command_data, result=None):
+        """已执行但标记失败的指令连同执行结果放回轮询器，下一轮作为重复指令补上标记，不会再次执行"""
+        if not self.command_poller().requeue(dict(command_data, _result=result), CONFIG['mark_retries']):
+            print(f"多次标记失败，放弃标记指令: {command_data.get('_id', '')}")
     
-    def is_duplicate_command(self, command_data: dict) -> bool:
-        """检查是否为重复指令"""
+    async def is_duplicate_command(self, command_data: dict) -> bool:
+        """检查是否为重复指令；不是时记入已执行指令记录"""
         current_cmd_id = command_data.get('_id', '')
         current_cmd = command_data.get('command', '')
         
+        # 云指令按ID去重，已执行指令记录跨重启保存，并与坐姿监测共用；
+        # 记录时要加文件锁并落盘，放到线程池中避免阻塞事件循环
+        if current_cmd_id:
+            if not await asyncio.to_thread(self.ledger.claim, current_cmd_id):
+                print(f"跳过已执行的指令: {current_cmd}")
+                return True
+            return False
+        
         # 如果指令ID和内容都与上次相同，则认为是重复指令
         if (current_cmd_id == device_state['last_command']['id'] and 
             current_cmd == device_state['last_command']['content']):
@@ -262,45 +303,50 @@ class BackgroundService:
         command = command_data.get('command', '')
         cmd_id = command_data.get('_id', '')
         
-        # 检查是否为重复指令
-        if self.is_duplicate_command(command_data):
-            return
-    
         # 只处理Python脚本指令
         if command.startswith("python:"):
+            # 检查是否为重复指令；之前执行过但没来得及标记的指令补上标记
+            if await self.is_duplicate_command(command_data):
+                result = command_data.get('_result')
+                if cmd_id and not await self.mark_command_executed(cmd_id, result):
+                    self.retry_mark(command_data, result)
+                return
+    
             script_path = command[7:].strip()
+            # 脚本并发执行，开始执行时就记录，避免同一指令被再次调度
+            device_state['last_command'] = {
+                'id': cmd_id,
+                'content': command,
+                'timestamp': asyncio.get_running_loop().time()
+            }
+            # 指令可以指定优先级('high'/'normal'/'low')和更严格的资源限制
+            priority = PRIORITIES.get(command_data.get('priority'), PRIORITY_NORMAL)
+            limits = {key: command_data[key] for key in ('cpu_seconds', 'memory_mb', 'nice') if key in command_data}
             try:
-                # 关键修改：直接让子进程继承父进程的标准输出/错误
-                process = subprocess.Popen(
-                    [sys.executable, script_path],
-                    cwd = '/home/elf/main'
-                )
                 print(f"开始执行Python脚本: {script_path}")
-                
-                # 等待进程结束（带超时）
-                try:
-                    process.wait(timeout=CONFIG['cmd_timeout'])
-                    returncode = process.poll()
-                    if returncode == 0:
-                        print(f"Python脚本执行成功: {script_path}")
-                    else:
-                        print(f"Python脚本执行失败，返回码: {returncode}")
-                except subprocess.TimeoutExpired:
-                    process.kill()
+                result = await self.executor.run_script(script_path, priority, limits)
+                if result['status'] == 'success':
+                    print(f"Python脚本执行成功: {script_path}")
+                elif result['status'] == 'timeout':
                     print("Python脚本执行超时，已终止")
+                elif result['status'] == 'killed':
+                    print(f"Python脚本被终止({result['signal']})，可能超出了资源限制: {script_path}")
+                else:
+                    print(f"Python脚本执行失败，返回码: {result['returncode']}")
+            except asyncio.QueueFull:
+                # 没有执行的指令保持未完成状态并撤销记录，下一轮轮询重新提交
+                print(f"指令队列已满，稍后重试: {script_path}")
+                if cmd_id:
+                    await asyncio.to_thread(self.ledger.release, cmd_id)
+                    self.command_poller().requeue(command_data)
+                return
             except Exception as e:
                 print(f"执行Python脚本出错: {str(e)}")
-            
-            # 更新最后执行的指令信息
-            device_state['last_command'] = {
-                'id': cmd_id,
-                'content': command,
-                'timestamp': asyncio.get_event_loop().time()
-            }
+                result = {'status': 'error', 'error': str(e)}
     
-            # 标记云指令为已执行
-            if cmd_id:
-                await self.mark_command_executed(cmd_id)
+            # 标记云指令为已执行，并写回执行结果；失败时在之后的轮询中补标记
+            if cmd_id and not await self.mark_command_executed(cmd_id, result):
+                self.retry_mark(command_data, result)
 
 class DesktopApp(QMainWindow):
     def __init__(self):
@@ -352,8 +398,9 @@ class DesktopApp(QMainWindow):
         except Exception as e:
             print(f"清理文档目录错误: {e}")
             
-        # 停止后台服务
+        # 停止后台服务并关闭保持的HTTP连接
         self.background_service.stop()
+        cloud_http.close()
         event.accept()
 
 
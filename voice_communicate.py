@@ -16,6 +16,7 @@ import sounddevice as sd
 import tempfile
 import os
 from openai import OpenAI
+from cloud_http import HTTP_CONFIG
 import re
 import pyttsx3
 
@@ -35,6 +36,20 @@ STATUS_LAST_FRAME = 2  # 最后一帧标识
 # Deepseek AI 参数
 DEEPSEEK_API_KEY = ""
 DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+_ai_client = None  # 共享的Deepseek客户端，复用keep-alive连接
+
+
+def get_ai_client():
+    """返回共享的OpenAI客户端(首次调用时创建)，超时与cloud_http保持一致"""
+    global _ai_client
+    if _ai_client is None:
+        _ai_client = OpenAI(
+            api_key=DEEPSEEK_API_KEY,
+            base_url=DEEPSEEK_BASE_URL,
+            timeout=HTTP_CONFIG['read_timeout'] * 3,  # 生成回答比普通接口慢
+            max_retries=1                     # 生成回答的POST不是幂等的，最多重试一次，避免重复计费和长时间等待
+        )
+    return _ai_client
 
 # 讯飞API参数 (请替换为您的实际参数)
 APPID = ''  # 应用ID
@@ -240,8 +255,8 @@ class VoiceRecognitionThread(QThread):
                     global messages
                     messages.append({"role": "user", "content": f"{result}"})
 
-                    # 创建OpenAI客户端
-                    client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url=DEEPSEEK_BASE_URL)
+                    # 共享的OpenAI客户端(不再每次请求重新建立连接)
+                    client = get_ai_client()
 
                     # 调用Deepseek API
                     response = client.chat.completions.create(